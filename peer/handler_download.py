@@ -1,5 +1,6 @@
 from io_file_handler import torrent_shared_file_handler
 from peer_connection_helper import Peer_connection
+from piece_bitfield import Piece_bitfield
 
 from threading import *
 
@@ -23,15 +24,15 @@ class Handle_download():
         self.data_folder_path = data_folder_path
 
         """
-            peer_have_piece[i] = [] # List of peers having the ith piece
+            peer_bitfields[i] = Piece_bitfield # pieces the ith peer has
         """
-        self.peer_have_piece = {i: [] for i in range(torrent_metadata.pieces_count)}
+        self.peer_bitfields = {}
 
         # Initialize the IO handler
         self.file_handler = torrent_shared_file_handler(self.torrent_metadata, self.data_folder_path)
 
         # Bitfield for pieces downloaded from peers
-        self.bitfield_pieces_downloaded = set([])
+        self.bitfield_pieces_downloaded = Piece_bitfield(torrent_metadata.pieces_count)
 
         # Array to track how many pieces each peer is handling
         self.num_pieces_peer_handles = [0] * len(self.peers_list)
@@ -65,11 +66,9 @@ class Handle_download():
             print(f"Invalid bitfield received from peer {peer_idx}.")
             return False
 
-        # Update the list of peers that have each piece
+        # Keep the pieces the peer has
         with self.handle_lock:
-            for i in range(self.torrent_metadata.pieces_count):
-                if peer_bitfield[i]:
-                    self.peer_have_piece[i].append(peer_idx)
+            self.peer_bitfields[peer_idx] = peer_bitfield
 
         print(f"Connected to peer {peer_idx}. Bitfield updated.")
         return True
@@ -111,24 +110,29 @@ class Handle_download():
         and then each peer downloads its assigned pieces.
         """
         cur_bitfield = self.torrent_log.get_bitfield(self.torrent_metadata.info_hash)
-        for idx in range(len(cur_bitfield)):
-            if cur_bitfield[idx] == 1:
-                self.bitfield_pieces_downloaded.add(idx)
-
-        # List of pieces that still need to be downloaded
-        pieces_to_download = set(range(self.torrent_metadata.pieces_count)) - self.bitfield_pieces_downloaded
-        print(f"Total pieces to download: {len(pieces_to_download)}")
+        if len(cur_bitfield) == self.torrent_metadata.pieces_count:
+            self.bitfield_pieces_downloaded = cur_bitfield.copy()
+        own_bitfield = self.bitfield_pieces_downloaded
+
+        # Number of pieces that still need to be downloaded
+        pieces_missing = own_bitfield.length - own_bitfield.count()
+        print(f"Total pieces to download: {pieces_missing}")
+
+        # peers that can provide each missing piece, from the pieces each peer has that the client lacks
+        peer_have_piece = {}
+        for peer_idx, peer_bitfield in self.peer_bitfields.items():
+            for piece_idx in peer_bitfield.and_not(own_bitfield).set_bits():
+                peer_have_piece.setdefault(piece_idx, []).append(peer_idx)
+        if len(peer_have_piece) < pieces_missing:
+            print(f"No peers available for {pieces_missing - len(peer_have_piece)} pieces. Skipping.")
 
         # Create a dictionary to assign pieces to each peer
         peer_piece_map = {peer_idx: [] for peer_idx in range(len(self.peers_list))}
 
         # Assign pieces to peers
-        for piece_idx in pieces_to_download:
+        for piece_idx in sorted(peer_have_piece):
             # List of peers that can provide this piece
-            available_peers = self.peer_have_piece.get(piece_idx, [])
-            if not available_peers:
-                print(f"No peers available for piece {piece_idx}. Skipping.")
-                continue
+            available_peers = peer_have_piece[piece_idx]
 
             # Select the peer with the fewest assigned pieces
             best_peer = min(available_peers, key=lambda peer_idx: len(peer_piece_map[peer_idx]))
@@ -151,7 +155,7 @@ class Handle_download():
             thread.join()
 
         # Check if all pieces have been downloaded
-        if not (set(range(self.torrent_metadata.pieces_count)) - self.bitfield_pieces_downloaded):
+        if self.bitfield_pieces_downloaded.is_complete():
             with self.handle_lock:
                 self.download_complete = True
             print("All pieces downloaded successfully!")
@@ -167,7 +171,7 @@ class Handle_download():
             if peer.download_piece(piece_idx):
                 print(f"Peer {peer_idx} successfully downloaded piece {piece_idx}.")
                 with self.handle_lock:
-                    self.bitfield_pieces_downloaded.add(piece_idx)
+                    self.bitfield_pieces_downloaded[piece_idx] = 1
             else:
                 print(f"Peer {peer_idx} failed to download piece {piece_idx}.")
 
@@ -86,11 +86,7 @@ class torrent_shared_file_handler():
                 self.file_handlers.append(file_handler)
                 current_offset += file_info['length']
 
-    def write_block(self, piece_message):
-        piece_index = piece_message.piece_index
-        block_offset = piece_message.block_offset
-        data_block = piece_message.block
-
+    def write_data(self, piece_index, block_offset, data_block):
         global_offset = piece_index * self.piece_size + block_offset
         remaining_data = data_block
 
@@ -6,7 +6,7 @@ import requests
 import string
 
 from torrent_log import TorrentLog
-from tracker_http import Tracker_http
+from tracker_http import Tracker_http, Tracker_http_batch
 from torrent_helper import generate_torrent_file
 from peer_connection_helper import Peer_connection
 from peer_wire_messages import *
@@ -169,6 +169,24 @@ class Peer:
         tracker_http.announce_started()
         print(tracker_http.__str__())
 
+    def announce_all(self, event="started"):
+        """Announce every torrent in the torrent log with a single batch request to the tracker."""
+        if not self.torrent_log.torrent_data:
+            print("No torrents to announce.")
+            return False
+
+        print(f"Announcing {len(self.torrent_log.torrent_data)} torrents to tracker...")
+        tracker_batch = Tracker_http_batch(self.torrent_log, self.peer_id, self.peer_port, self.tracker_url)
+        for info_hash in self.torrent_log.torrent_data:
+            tracker_batch.add_torrent(info_hash, event)
+
+        if tracker_batch.request_announce():
+            print(tracker_batch.__str__())
+            return True
+        else:
+            print("Batch announce not successful.")
+            return False
+
     def update_torrent_log(self):
         self.torrent_log.scan_torrent_files()
         self.torrent_log.print_torrent_info()
@@ -231,6 +249,7 @@ if __name__ == "__main__":
             "  announce_have_data <info_hash>           - Announce complete and send torrent file to tracker\n"
             "  download_torrent_by_info_hash <info_hash>- Get torrent by info hash\n"
             "  get_peers <info_hash>                    - List peers for the specified info hash\n"
+            "  announce_all [event]                     - Announce every torrent in one request\n"
             "  update_torrent_log                       - Update the torrent log from folder\n"
             "  generate_torrent_file <data_file_path>   - Generate a .torrent file\n"
             "  download_file <info_hash>                - Start downloading a file\n"
@@ -272,6 +291,9 @@ if __name__ == "__main__":
                     else:
                         peer.get_peers(info_hash=args[1])
 
+                elif action == "announce_all":
+                    peer.announce_all(event=args[1] if len(args) > 1 else "started")
+
                 elif action == "update_torrent_log":
                     peer.update_torrent_log()
 
@@ -299,6 +321,7 @@ if __name__ == "__main__":
                         "  stop                                     - Stop the peer and disconnect\n"
                         "  announce_have_data <info_hash>           - Announce completion to tracker\n"
                         "  get_peers <info_hash>                    - List peers for the specified info hash\n"
+                        "  announce_all [event]                     - Announce every torrent in one request\n"
                         "  update_torrent_log                       - Update torrent log from folder\n"
                         "  generate_torrent_file <data_file_path>   - Generate a .torrent file\n"
                         "  download_file <info_hash>                - Start downloading a file\n"
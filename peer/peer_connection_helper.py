@@ -46,6 +46,9 @@ class Peer_connection():
         # bitfield
         self.bitfield = None
 
+        # piece being downloaded as (piece index, piece view, requested blocks {(block offset, block length)})
+        self.piece_in_progress = None
+
         # response message handler for recieved message
         self.response_handler = { KEEP_ALIVE    : self.recieved_keep_alive,
                                   HAVE          : self.recieved_have, 
@@ -119,6 +122,15 @@ class Peer_connection():
             print(f"Failed to send data to peer {self.peer_ip}:{self.peer_port}")
             self.close_peer_connection()
 
+    """
+        function helps send a message given as a list of buffers to the peer
+        connection, block data is never copied before it reaches the socket
+    """
+    def send_buffers(self, buffers):
+        if not self.peer_sock.send_buffers(buffers):
+            print(f"Failed to send data to peer {self.peer_ip}:{self.peer_port}")
+            self.close_peer_connection()
+
     """
         function helps in sending peer messgae given peer wire message 
         class object as an argument to the function
@@ -126,48 +138,34 @@ class Peer_connection():
     def send_message(self, peer_request):
         if self.handshake_flag:
             # send the message 
-            self.send(peer_request.message())
+            self.send_buffers(peer_request.buffers())
 
     """
         functions helpes in recieving peer wire protocol messages.
     """
     def recieve_message(self):
-        # extract the peer wire message information by receiving chunks of data
-        # recieve the message length 
-        raw_message_length = self.recieve(MESSAGE_LENGTH_SIZE)
-        if raw_message_length is None or len(raw_message_length) < MESSAGE_LENGTH_SIZE:
+        # recieve the whole message at once, a view of the socket buffer valid until the next recieve
+        raw_message = self.peer_sock.recieve_frame()
+        if raw_message is None:
             return None
 
-        # unpack the message length which is 4 bytes long
-        message_length = struct.unpack_from("!I", raw_message_length)[0]
+        # the message length is the length of the frame
+        message_length = len(raw_message)
         # keep alive messages have no message ID and payload
         if message_length == 0:
             return peer_wire_message(message_length, None, None)
 
-        # attempt to recieve the message ID from message
-        raw_message_ID =  self.recieve(MESSAGE_ID_SIZE)
-        if raw_message_ID is None:
-            return None
-        
-        # unpack the message length which is 4 bytes long
-        message_id  = struct.unpack_from("!B", raw_message_ID)[0]
+        # the message id is the first byte of the frame
+        message_id = raw_message[0]
         # messages having no payload 
         if message_length == 1:
             return peer_wire_message(message_length, message_id, None)
-       
-        # extract all the payload
-        payload_length = message_length - 1
-        
-        # extract the message payload 
-        message_payload = self.recieve(payload_length)
-        if message_payload is None:
-            return None
-        
+
         # keep alive timer updated 
         self.keep_alive_timer = time.time()
 
         # return peer wire message object given the three parameters
-        return peer_wire_message(message_length, message_id, message_payload)
+        return peer_wire_message(message_length, message_id, raw_message[MESSAGE_ID_SIZE:])
     
     
     """
@@ -231,20 +229,23 @@ class Peer_connection():
         function handles any peer message
     """
     def handle_response(self):
-        # recieve messages from the peer
-        peer_response_message = self.recieve_message()
-        # if there is no response from the peer
-        if peer_response_message is None:
-            return None
-
-        # DECODE the peer wire message into appropriate peer wire message type type
-        decoded_message = Peer_message_decoder().decode(peer_response_message)
-        if decoded_message is None:
-            return None
-
-        # select the respective message handler 
-        message_handler = self.response_handler[decoded_message.message_id]
-        message_handler(decoded_message)
+        # messages this client does not use (extensions, PORT, CANCEL) are skipped,
+        # None is only returned once nothing more is recieved from the peer
+        decoded_message = None
+        while decoded_message is None:
+            # recieve messages from the peer
+            peer_response_message = self.recieve_message()
+            # if there is no response from the peer
+            if peer_response_message is None:
+                return None
+
+            # DECODE the peer wire message into appropriate peer wire message type type
+            decoded_message = peer_message_decoder.decode(peer_response_message)
+
+        # select the respective message handler, messages without one need no handling
+        message_handler = self.response_handler.get(decoded_message.message_id)
+        if message_handler is not None:
+            message_handler(decoded_message)
 
         return decoded_message
 
@@ -326,11 +327,12 @@ class Peer_connection():
     """
     def recieved_bitfield(self, bitfield_message):
         print(f"Bitfield message recieved from peer {self.peer_ip}:{self.peer_port} with meesage {bitfield_message}")
-        # extract the bitfield piece information from the message
-        cur_bitfield = bitfield_message.payload_to_bitfield()
         self.total_pieces = self.torrent_metadata.pieces_count
-        # update the bitfield information in the peer bitfiled fixed length
-        self.bitfield = cur_bitfield[:self.total_pieces]
+        # extract the bitfield piece information from the message with fixed length
+        try:
+            self.bitfield = bitfield_message.payload_to_bitfield(self.total_pieces)
+        except ValueError as e:
+            print(f"Invalid bitfield from peer {self.peer_ip}:{self.peer_port}: {e}")
 
 
     """
@@ -363,13 +365,22 @@ class Peer_connection():
             return None
 
     """
-        recieved piece          : peer has responed with the piece to client
-                                    after recieving any piece, it is written into file
+        recieved piece          : peer has responed with a block outside the piece fast path,
+                                    e.g. late after a retry. A block requested for the piece
+                                    in progress is copied into it, any other block is dropped.
+                                    Only download_piece writes into the file, once the piece is validated
     """
     def recieved_piece(self, piece_message):
         print(f"Piece message recieved from peer {self.peer_ip}:{self.peer_port} with meesage {piece_message}")
-        # write the block of piece into the file
-        self.file_handler.write_block(piece_message) 
+        if self.piece_in_progress is None:
+            return
+        piece_index, piece_view, requested_blocks = self.piece_in_progress
+        block_offset = piece_message.block_offset
+        block = piece_message.block
+        if piece_message.piece_index == piece_index and (block_offset, len(block)) in requested_blocks:
+            piece_view[block_offset:block_offset + len(block)] = block
+            # a block is only copied once, duplicates of it are dropped
+            requested_blocks.discard((block_offset, len(block)))
 
 
     """
@@ -468,15 +479,17 @@ class Peer_connection():
         if not self.download_possible():
             return False
 
-        # recieved piece data from the peer
-        recieved_piece = b''  
+        # piece length for torrent 
+        piece_length = self.torrent_metadata.get_piece_length(piece_index)
+        # recieved piece data from the peer, every block is recieved straight into its place
+        recieved_piece = bytearray(piece_length)
+        piece_view = memoryview(recieved_piece)
         # block offset for downloading the piece
         block_offset = 0
         # block length 
         block_length = 0
-        # piece length for torrent 
-        piece_length = self.torrent_metadata.get_piece_length(piece_index)
 
+        self.piece_in_progress = (piece_index, piece_view, set())
         # loop untill you download all the blocks in the piece
         while self.download_possible() and block_offset < piece_length:
             # find out how much max length of block that can be requested
@@ -485,15 +498,18 @@ class Peer_connection():
             else:
                 block_length = piece_length - block_offset
             
-            block_data = self.download_block(piece_index, block_offset, block_length)
-            if block_data:
+            if self.download_block(piece_index, block_offset, block_length, piece_view):
                 # increament offset according to size of data block recieved
-                recieved_piece += block_data
                 block_offset   += block_length
         
+        self.piece_in_progress = None
+
         # validate the piece and update the peer downloaded bitfield
         if(not self.validate_piece(recieved_piece, piece_index)):
             return False
+
+        # write the validated piece into the file at once
+        self.file_handler.write_data(piece_index, 0, piece_view)
         
         # updata the bitfield of the peer
         self.torrent_log.update_bitfield(self.info_hash, piece_index, 1)
@@ -501,28 +517,80 @@ class Peer_connection():
         return True
     
     """
-        function helps in download given block of the piece from peer
+        function helps in download given block of the piece from peer into
+        its place in the piece view, returns success/failure
     """
-    def download_block(self, piece_index, block_offset, block_length):
+    def download_block(self, piece_index, block_offset, block_length, piece_view):
         # create a request message for given piece index and block offset
         request_message = request(piece_index, block_offset, block_length)
         # send request message to peer
         self.send_message(request_message)
-        
-        # recieve response message and handle the response
-        response_message = self.handle_response()
-        
-        # if the message recieved was a piece message
-        if not response_message or response_message.message_id != PIECE:
-            print(f"Failed to download block {block_offset} of piece {piece_index}")
+        requested_blocks = self.piece_in_progress[2] if self.piece_in_progress is not None else set()
+        requested_blocks.add((block_offset, block_length))
+
+        # messages recieved before the block are handled as usual and the block
+        # is waited for again, it is never requested twice
+        while True:
+            # recieve the requested block straight into the piece
+            block_recieved = self.recieve_block_into(piece_index, block_offset, block_length, piece_view)
+            if block_recieved:
+                requested_blocks.discard((block_offset, block_length))
+                # successfully downloaded and validated block of piece
+                return True
+            if block_recieved is False:
+                # the stream was cut in the middle of the block
+                print(f"Failed to download block {block_offset} of piece {piece_index}")
+                self.close_peer_connection()
+                return False
+
+            # nothing recieved yet, the connection is kept and the block requested again
+            if self.peer_sock.recieve_timed_out():
+                print(f"Timed out waiting for block {block_offset} of piece {piece_index}")
+                return False
+
+            # any other message is recieved and handled as usual
+            response_message = self.handle_response()
+            if response_message is None:
+                if self.peer_sock.recieve_timed_out():
+                    print(f"Timed out waiting for block {block_offset} of piece {piece_index}")
+                else:
+                    print(f"Failed to download block {block_offset} of piece {piece_index}")
+                return False
+            # the block was copied into the piece by the piece message handler
+            if (block_offset, block_length) not in requested_blocks:
+                return True
+
+    """
+        function recieves the next message if it is the PIECE message of the
+        requested block, its block is recieved straight into its place in the
+        piece view. Returns True when the block was recieved, False if the
+        connection failed and None if the next message is any other message,
+        which is left unread, or if nothing was recieved before the timeout
+    """
+    def recieve_block_into(self, piece_index, block_offset, block_length, piece_view):
+        # peek the message length, a keep alive message has nothing more
+        raw_message_length = self.peer_sock.peek_data(MESSAGE_LENGTH_SIZE)
+        if raw_message_length is None:
+            return False if self.peer_sock.recieve_failed() else None
+        if MESSAGE_LENGTH_STRUCT.unpack(raw_message_length)[0] != 9 + block_length:
             return None
-        # validate if correct response is recieved for the piece message
-        if not self.validate_request_piece_messages(request_message, response_message):
-            print(f"Block {block_offset} of piece {piece_index} validation failed")
+
+        # peek the message id, piece index and block offset
+        raw_piece_header = self.peer_sock.peek_data(PIECE_HEADER_STRUCT.size)
+        if raw_piece_header is None:
+            return False if self.peer_sock.recieve_failed() else None
+        _, message_id, recieved_piece_index, recieved_block_offset = PIECE_HEADER_STRUCT.unpack(raw_piece_header)
+        if (message_id, recieved_piece_index, recieved_block_offset) != (PIECE, piece_index, block_offset):
             return None
 
-        # successfully downloaded and validated block of piece
-        return response_message.block
+        # the block goes from the socket to the piece without any intermediate copy
+        self.peer_sock.skip_data(PIECE_HEADER_STRUCT.size)
+        if not self.peer_sock.recieve_data_into(piece_view[block_offset:block_offset + block_length]):
+            return False
+
+        # keep alive timer updated 
+        self.keep_alive_timer = time.time()
+        return True
 
     """
         ======================================================================
@@ -2,6 +2,161 @@ from socket import *
 from select import *
 from threading import *
 import sys
+import struct
+
+# size of the reusable receive buffer of a frame reader
+FRAME_READER_BUFFER_SIZE = 256 * (2 ** 10)  # 256 KB
+
+# frames longer than this are treated as a broken connection
+MAX_FRAME_SIZE = 4 * (2 ** 20)  # 4 MB
+
+"""
+    Buffered reader of length prefixed frames over a socket
+
+    ---------------------------------------------------
+    | consumed | start ... received ... end | free    |
+    ---------------------------------------------------
+
+    The reader pulls as much data as the socket has into one reusable bytearray
+    and hands out the frames as memoryviews of it, so a stream of small messages
+    costs one recv call instead of three per message. A frame cut by a timeout
+    stays in the buffer and is completed by the next read.
+
+    A view returned by the reader is only valid until the next read, the
+    unread data is then moved to the front of the buffer. The buffer is never
+    resized while views of it may exist, a frame larger than the buffer gets a
+    new bytearray instead.
+
+    The buffer is only allocated by the first read, sockets that never recieve
+    cost nothing, and a buffer grown for a large frame is replaced by one of
+    the default size once the frame is consumed.
+"""
+class Frame_reader():
+    def __init__(self, peer_socket, buffer_size = FRAME_READER_BUFFER_SIZE):
+        self.peer_socket = peer_socket
+        self.buffer_size = buffer_size
+        self.buffer = None
+        self.view = None
+        # unread data is buffer[start:end]
+        self.start = 0
+        self.end = 0
+        # set on a protocol error, the stream can not be framed any more
+        self.broken = False
+        # set once the peer closed the connection or it failed
+        self.closed = False
+        # set when the last fill timed out, what was recieved is kept
+        self.timed_out = False
+
+    """
+        function makes sure at least data_size unread bytes are buffered,
+        returns False if the connection was closed or timed out before
+    """
+    def fill(self, data_size):
+        self.timed_out = False
+        if self.broken or self.closed:
+            return False
+        available = self.end - self.start
+        if available >= data_size:
+            return True
+
+        # make room for the rest of the data after the unread bytes, in a new
+        # buffer on the first read, for a frame larger than the buffer or once a
+        # buffer grown for a large frame is not needed any more
+        if (self.buffer is None or data_size > len(self.buffer)
+                or (len(self.buffer) > self.buffer_size and data_size <= self.buffer_size)):
+            buffer = bytearray(max(data_size, self.buffer_size))
+            if available:
+                buffer[:available] = self.view[self.start:self.end]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+            self.start = 0
+            self.end = available
+        elif self.start + data_size > len(self.buffer):
+            self.buffer[:available] = self.buffer[self.start:self.end]
+            self.start = 0
+            self.end = available
+
+        # loop untill enough data is buffered, recieving as much as fits
+        while self.end - self.start < data_size:
+            try:
+                recieved_length = self.peer_socket.recv_into(self.view[self.end:])
+            except timeout:
+                self.timed_out = True
+                return False
+            except:
+                recieved_length = 0
+            if recieved_length == 0:
+                self.closed = True
+                return False
+            self.end += recieved_length
+        return True
+
+    """
+        function returns a view of the next data_size bytes, or None
+    """
+    def read(self, data_size):
+        if not self.fill(data_size):
+            return None
+        data = self.view[self.start:self.start + data_size]
+        self.start += data_size
+        return data
+
+    """
+        function returns a view of the next data_size bytes without consuming
+        them, or None
+    """
+    def peek(self, data_size):
+        if not self.fill(data_size):
+            return None
+        return self.view[self.start:self.start + data_size]
+
+    """
+        function consumes data_size bytes already buffered
+    """
+    def skip(self, data_size):
+        self.start += data_size
+
+    """
+        function fills the destination buffer with the next bytes, the buffered
+        ones are copied and the rest is recieved straight into the destination.
+        returns False if the connection was closed or timed out before
+    """
+    def read_into(self, destination):
+        if self.broken:
+            return False
+        buffered_length = min(self.end - self.start, len(destination))
+        if buffered_length:
+            destination[:buffered_length] = self.view[self.start:self.start + buffered_length]
+            self.start += buffered_length
+
+        recieved_length = buffered_length
+        while recieved_length < len(destination):
+            try:
+                chunk_length = self.peer_socket.recv_into(destination[recieved_length:])
+            except:
+                chunk_length = 0
+            if chunk_length == 0:
+                return False
+            recieved_length += chunk_length
+        return True
+
+    """
+        function returns a view of the next frame without its 4 bytes length
+        prefix, or None. The length prefix is only consumed with the whole frame
+    """
+    def read_frame(self):
+        if not self.fill(4):
+            return None
+        frame_length = struct.unpack_from("!I", self.buffer, self.start)[0]
+        if frame_length > MAX_FRAME_SIZE:
+            print(f"Frame of {frame_length} bytes exceeds the maximum frame size")
+            self.broken = True
+            return None
+        if not self.fill(4 + frame_length):
+            return None
+        frame = self.view[self.start + 4:self.start + 4 + frame_length]
+        self.start += 4 + frame_length
+        return frame
 
 
 # class for general peer socket 
@@ -28,6 +183,9 @@ class Peer_socket():
         # the maximum peer request
         self.max_peer_requests = 50
 
+        # buffered reader of all the data recieved from the peer
+        self.frame_reader = Frame_reader(self.peer_socket)
+
 
     # function to configure the socket to listening
     def config_socket_to_listening(self):
@@ -45,25 +203,64 @@ class Peer_socket():
     def recieve_data(self, data_size):
         if not self.peer_connection:
             return 
-        peer_raw_data = b''
-        recieved_data_length = 0
-        request_size = data_size
-        
-        # loop untill you recieve all the data from the peer
-        while(recieved_data_length < data_size):
-            # attempt recieving requested data size in chunks
-            try:
-                chunk = self.peer_socket.recv(request_size)
-            except:
-                chunk = b''
-            if len(chunk) == 0:
-                return None
-            peer_raw_data += chunk
-            request_size -=  len(chunk)
-            recieved_data_length += len(chunk)
+        # recieve through the frame reader, data buffered after it is kept for the next frames
+        peer_raw_data = self.frame_reader.read(data_size)
+        if peer_raw_data is None:
+            return None
 
         # return required size data recieved from peer
-        return peer_raw_data
+        return bytes(peer_raw_data)
+
+    """
+        function returns the next data_size bytes recieved as a memoryview
+        valid until the next recieve, without consuming them, else None
+    """
+    def peek_data(self, data_size):
+        if not self.peer_connection:
+            return None
+        return self.frame_reader.peek(data_size)
+
+    """
+        function consumes data_size bytes returned by peek_data
+    """
+    def skip_data(self, data_size):
+        self.frame_reader.skip(data_size)
+
+    """
+        function recieves exactly len(destination) bytes into the destination
+        buffer without any intermediate copy, returns success/failure
+    """
+    def recieve_data_into(self, destination):
+        if not self.peer_connection:
+            return False
+        return self.frame_reader.read_into(destination)
+
+    """
+        function returns the next length prefixed frame recieved, without its
+        length prefix, as a memoryview valid until the next recieve, else None
+    """
+    def recieve_frame(self):
+        if not self.peer_connection:
+            return None
+        frame = self.frame_reader.read_frame()
+        # a peer breaking the protocol or closing the connection is disconnected
+        if frame is None and self.recieve_failed():
+            self.disconnect()
+        return frame
+
+    """
+        function checks if the last recieve failed because the connection was
+        closed or broken, a timeout is not a failure
+    """
+    def recieve_failed(self):
+        return not self.peer_connection or self.frame_reader.broken or self.frame_reader.closed
+
+    """
+        function checks if the last recieve timed out, the data recieved
+        before the timeout is kept for the next recieve
+    """
+    def recieve_timed_out(self):
+        return self.frame_reader.timed_out
    
     """
         function helps send raw data by the socket
@@ -83,6 +280,34 @@ class Peer_socket():
                 return False
         return True
 
+    """
+        function sends a list of buffers as one message with scatter-gather,
+        the buffers are never joined in user space. Returns success/failure
+        like send_data
+    """
+    def send_buffers(self, buffers):
+        if not self.peer_connection:
+            return False
+        # platforms without sendmsg send the buffers one after another
+        if not hasattr(self.peer_socket, "sendmsg"):
+            return all(self.send_data(buffer) for buffer in buffers)
+
+        buffers = [memoryview(buffer).cast('B') for buffer in buffers]
+        while buffers:
+            try:
+                # attempting to send all the remaining buffers
+                data_length_send = self.peer_socket.sendmsg(buffers)
+            except:
+                # the TCP connection is broken
+                return False
+            # drop the buffers sent completely, then the part sent of the next one
+            while buffers and data_length_send >= len(buffers[0]):
+                data_length_send -= len(buffers[0])
+                buffers.pop(0)
+            if buffers:
+                buffers[0] = buffers[0][data_length_send:]
+        return True
+
     """
         attempts to connect the peer using TCP connection 
     """
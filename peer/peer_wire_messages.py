@@ -1,4 +1,5 @@
 import struct
+from piece_bitfield import Piece_bitfield
 
 """
     As per Peer Wire Protocol all the messages exchanged in between 
@@ -36,6 +37,24 @@ MESSAGE_ID_SIZE = 1
 # constant handshake message length
 HANDSHAKE_MESSAGE_LENGTH = 68
 
+# precompiled message headers, packed in a single call
+MESSAGE_LENGTH_STRUCT   = struct.Struct("!I")           # message length
+MESSAGE_HEADER_STRUCT   = struct.Struct("!IB")          # message length, message id
+HAVE_PAYLOAD_STRUCT     = struct.Struct("!I")           # piece index
+REQUEST_PAYLOAD_STRUCT  = struct.Struct("!III")         # piece index, block offset, block length
+PIECE_HEADER_STRUCT     = struct.Struct("!IBII")        # message length, message id, piece index, block offset
+PIECE_PAYLOAD_STRUCT    = struct.Struct("!II")          # piece index, block offset
+HANDSHAKE_STRUCT        = struct.Struct("!B19sQ20s20s") # protocol length, protocol name, reserved, info hash, peer id
+
+"""
+    Encodes the header of a piece message and returns (header, block view).
+    The block is never copied, the two buffers are sent together with sendmsg.
+"""
+def encode_piece(piece_index, block_offset, block):
+    block_view = memoryview(block)
+    header = PIECE_HEADER_STRUCT.pack(9 + len(block_view), PIECE, piece_index, block_offset)
+    return header, block_view
+
 class peer_wire_message:
     def __init__(self, message_length, message_id, payload):
         self.message_length = message_length
@@ -44,18 +63,19 @@ class peer_wire_message:
 
     # return raw message
     def message(self):
-        # pack the message length
-        message = struct.pack("!I", self.message_length)
+        # keep alive message has only the message length
+        if self.message_id is None:
+            return MESSAGE_LENGTH_STRUCT.pack(self.message_length)
 
-        # pack the message id
-        if self.message_id is not None:
-            message += struct.pack("!B", self.message_id)
+        # pack the message length and message id together
+        header = MESSAGE_HEADER_STRUCT.pack(self.message_length, self.message_id)
+        if self.payload is None:
+            return header
+        return header + self.payload
 
-        # pack the payload
-        if self.payload is not None:
-            message += self.payload
-        
-        return message
+    # return the message as a list of buffers to be sent with scatter-gather
+    def buffers(self):
+        return [self.message()]
     
     # printing the peer wire message
     def __str__(self):
@@ -96,22 +116,9 @@ class Handshake_message:
 
     # return the raw hanshake message
     def message(self):
-        # pack the protocol name
-        message = struct.pack("!B", len(self.protocol_name))
-        
-        # pack the protocol name
-        message += struct.pack("!19s", self.protocol_name.encode())
-
-        # pack the reserved bytes
-        message += struct.pack("!Q", 0x0)
-
-        # pack the info hash
-        message += struct.pack("!20s", bytes.fromhex(self.info_hash))
-
-        # pack the peer id
-        message += struct.pack("!20s", self.client_peer_id.encode())
-
-        return message
+        # pack the protocol name length, protocol name, reserved bytes, info hash and peer id
+        return HANDSHAKE_STRUCT.pack(len(self.protocol_name), self.protocol_name.encode(), 0x0,
+                                     bytes.fromhex(self.info_hash), self.client_peer_id.encode())
     
     def validation(self, handshake_message):
         response_handshake_length = len(handshake_message)
@@ -215,7 +222,7 @@ class have( peer_wire_message ):
     def __init__(self, piece_index):
         message_length  = 5
         message_id      = HAVE
-        payload         = struct.pack("!I", piece_index)
+        payload         = HAVE_PAYLOAD_STRUCT.pack(piece_index)
 
         self.piece_index = piece_index
 
@@ -229,21 +236,9 @@ class have( peer_wire_message ):
         return message
     
 
-# handle bitfield message
+# handle bitfield message, the packed bits are the payload as they are
 def bitfield_to_payload(bitfield):
-    # pack the bitfield
-    while len(bitfield) % 8 != 0:
-        bitfield.append(0)
-
-    bit_field_payload = b''
-    for i in range(0, len(bitfield), 8):
-        byte = 0
-        for j in range(8):
-            byte = byte << 1
-            byte |= bitfield[i + j]
-        bit_field_payload += struct.pack("!B", byte)
-
-    return bit_field_payload
+    return bitfield.payload()
 
 
 
@@ -255,19 +250,15 @@ class Bitfield( peer_wire_message ):
 
         super().__init__(message_length, message_id, payload)
 
-    # extract the bitfield from the payload
-    def payload_to_bitfield(self):
-        bitfield = []
+    # return the header and a view of the bitfield payload
+    def buffers(self):
+        return [MESSAGE_HEADER_STRUCT.pack(self.message_length, self.message_id), memoryview(self.payload)]
 
-        for byte in (self.payload):
-            for i in range(8):
-                bit = (byte >> (7 - i)) & 1
-                bitfield.append(bit)
-
-        # # Delete the extra bits
-        # if len(bitfield) > total_pieces:
-        #     bitfield = bitfield[:total_pieces]
-        return bitfield
+    # extract the bitfield of total_pieces pieces from the payload, all the bits of the payload by default
+    def payload_to_bitfield(self, total_pieces=None):
+        if total_pieces is None:
+            total_pieces = len(self.payload) * 8
+        return Piece_bitfield.from_payload(self.payload, total_pieces)
 
     def __str__(self):
         message  = 'BITFIELD : '
@@ -280,9 +271,7 @@ class request( peer_wire_message ):
     def __init__(self, piece_index, block_offset, block_length):
         message_length  = 13                                # 4 bytes message length
         message_id      = REQUEST                           # 1 byte message id
-        payload         = struct.pack("!I", piece_index)    # 12 bytes payload
-        payload        += struct.pack("!I", block_offset) 
-        payload        += struct.pack("!I", block_length)
+        payload         = REQUEST_PAYLOAD_STRUCT.pack(piece_index, block_offset, block_length)   # 12 bytes payload
 
         self.piece_index    = piece_index
         self.block_offset   = block_offset
@@ -303,9 +292,7 @@ class piece(peer_wire_message):
     def __init__(self, piece_index, block_offset, block):
         message_length  = 9 + len(block)                    # 4 bytes message length
         message_id      = PIECE                             # 1 byte message id
-        payload         = struct.pack("!I", piece_index)    # variable length payload
-        payload        += struct.pack("!I", block_offset)
-        payload        += block
+        payload         = None                              # block is sent as it is, never copied into a payload
 
         self.piece_index    = piece_index
         self.block_offset   = block_offset
@@ -313,6 +300,14 @@ class piece(peer_wire_message):
 
         super().__init__(message_length, message_id, payload)
 
+    # return raw message, copies the block
+    def message(self):
+        return b''.join(self.buffers())
+
+    # return the header and a view of the block
+    def buffers(self):
+        return list(encode_piece(self.piece_index, self.block_offset, self.block))
+
     def __str__(self):
         message  = 'PIECE : '
         message += '(message paylaod : [ '
@@ -321,45 +316,151 @@ class piece(peer_wire_message):
         message += 'block length : '    + str(len(self.block))      + ' ])'
         return message
     
-class Peer_message_decoder():
+"""
+    Decoded messages are read-only views over the payload recieved, a field
+    is only unpacked when it is accessed and a piece block is never copied.
+    The payload is a view of the socket buffer, so a decoded message is only
+    valid until the next message is recieved from the same peer.
+"""
+class Have_view():
+    __slots__ = ("payload",)
+    message_id = HAVE
 
-    # initialize peer_message_decoder with given peer wire message instance
-    def decode(self, peer_message):
-        
-        # deocdes the given peer_message
-        if peer_message.message_id == KEEP_ALIVE :
-            self.peer_decoded_message = keep_alive()
+    def __init__(self, payload):
+        self.payload = payload
 
-        elif peer_message.message_id == CHOKE :    
-            self.peer_decoded_message = choke()
+    @property
+    def message_length(self):
+        return 1 + len(self.payload)
 
-        elif peer_message.message_id == UNCHOKE :        
-            self.peer_decoded_message = unchoke()
+    @property
+    def piece_index(self):
+        return HAVE_PAYLOAD_STRUCT.unpack_from(self.payload)[0]
 
-        elif peer_message.message_id == INTERESTED :     
-            self.peer_decoded_message = interested()
+    def __str__(self):
+        message  = 'HAVE : '
+        message += '(message length : ' + str(self.message_length) + '), '
+        message += '(message id : ' + str(self.message_id) + '), '
+        message += '(message paylaod : [piece index : ' + str(self.piece_index) + '])'
+        return message
 
-        elif peer_message.message_id == UNINTERESTED :
-            self.peer_decoded_message = uninterested()
+class Bitfield_view():
+    __slots__ = ("payload",)
+    message_id = BITFIELD
 
-        elif peer_message.message_id == HAVE :
-            piece_index = struct.unpack_from("!I", peer_message.payload)[0]
-            self.peer_decoded_message = have(piece_index)
+    def __init__(self, payload):
+        self.payload = payload
 
-        elif peer_message.message_id == BITFIELD :
-            self.peer_decoded_message = Bitfield(peer_message.payload)
+    @property
+    def message_length(self):
+        return 1 + len(self.payload)
 
-        elif peer_message.message_id == REQUEST :        
-            piece_index  = struct.unpack_from("!I", peer_message.payload, 0)[0]
-            block_offset = struct.unpack_from("!I", peer_message.payload, 4)[0]
-            block_length = struct.unpack_from("!I", peer_message.payload, 8)[0]
-            self.peer_decoded_message = request(piece_index, block_offset, block_length)
+    # extract the bitfield of total_pieces pieces from the payload, all the bits of the payload by default
+    def payload_to_bitfield(self, total_pieces=None):
+        if total_pieces is None:
+            total_pieces = len(self.payload) * 8
+        return Piece_bitfield.from_payload(self.payload, total_pieces)
 
-        elif peer_message.message_id == PIECE :          
-            piece_index  = struct.unpack_from("!I", peer_message.payload, 0)[0]
-            begin_offset = struct.unpack_from("!I", peer_message.payload, 4)[0]
-            block = peer_message.payload[8:]
-            self.peer_decoded_message = piece(piece_index, begin_offset, block)
-        
-        # returns the peer decoded message
-        return self.peer_decoded_message
\ No newline at end of file
+    def __str__(self):
+        message  = 'BITFIELD : '
+        message += '(message length : ' + str(self.message_length) + '), '
+        message += '(message id : ' + str(self.message_id) + '), '
+        message += '(message paylaod : [bitfield : ' + str(self.payload_to_bitfield()) + '])'
+        return message
+
+class Request_view():
+    __slots__ = ("payload",)
+    message_id = REQUEST
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    @property
+    def message_length(self):
+        return 1 + len(self.payload)
+
+    @property
+    def piece_index(self):
+        return REQUEST_PAYLOAD_STRUCT.unpack_from(self.payload)[0]
+
+    @property
+    def block_offset(self):
+        return REQUEST_PAYLOAD_STRUCT.unpack_from(self.payload)[1]
+
+    @property
+    def block_length(self):
+        return REQUEST_PAYLOAD_STRUCT.unpack_from(self.payload)[2]
+
+    def __str__(self):
+        piece_index, block_offset, block_length = REQUEST_PAYLOAD_STRUCT.unpack_from(self.payload)
+        message  = 'REQUEST : '
+        message += '(message paylaod : [ '
+        message += 'piece index : '     + str(piece_index)     + ', '
+        message += 'block offest : '    + str(block_offset)    + ', '
+        message += 'block length : '    + str(block_length)    + ' ])'
+        return message
+
+class Piece_view():
+    __slots__ = ("payload",)
+    message_id = PIECE
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    @property
+    def message_length(self):
+        return 1 + len(self.payload)
+
+    @property
+    def piece_index(self):
+        return PIECE_PAYLOAD_STRUCT.unpack_from(self.payload)[0]
+
+    @property
+    def block_offset(self):
+        return PIECE_PAYLOAD_STRUCT.unpack_from(self.payload)[1]
+
+    # view of the block data, never copied
+    @property
+    def block(self):
+        return memoryview(self.payload)[PIECE_PAYLOAD_STRUCT.size:]
+
+    def __str__(self):
+        piece_index, block_offset = PIECE_PAYLOAD_STRUCT.unpack_from(self.payload)
+        message  = 'PIECE : '
+        message += '(message paylaod : [ '
+        message += 'piece index : '     + str(piece_index)     + ', '
+        message += 'block offest : '    + str(block_offset)    + ', '
+        message += 'block length : '    + str(len(self.payload) - PIECE_PAYLOAD_STRUCT.size) + ' ])'
+        return message
+
+# messages without payload are all alike, one shared instance of each is returned by the decoder
+KEEP_ALIVE_MESSAGE      = keep_alive()
+CHOKE_MESSAGE           = choke()
+UNCHOKE_MESSAGE         = unchoke()
+INTERESTED_MESSAGE      = interested()
+UNINTERESTED_MESSAGE    = uninterested()
+
+class Peer_message_decoder():
+    # message id -> function building the decoded message from the payload
+    message_decoders = {
+        KEEP_ALIVE      : lambda payload: KEEP_ALIVE_MESSAGE,
+        CHOKE           : lambda payload: CHOKE_MESSAGE,
+        UNCHOKE         : lambda payload: UNCHOKE_MESSAGE,
+        INTERESTED      : lambda payload: INTERESTED_MESSAGE,
+        UNINTERESTED    : lambda payload: UNINTERESTED_MESSAGE,
+        HAVE            : Have_view,
+        BITFIELD        : Bitfield_view,
+        REQUEST         : Request_view,
+        PIECE           : Piece_view
+    }
+
+    # decodes the given peer wire message, returns None for messages the client ignores
+    # (extensions, PORT, CANCEL), the connection itself is still alive
+    def decode(self, peer_message):
+        message_decoder = self.message_decoders.get(peer_message.message_id)
+        if message_decoder is None:
+            return None
+        return message_decoder(peer_message.payload)
+
+# shared decoder, it holds no state
+peer_message_decoder = Peer_message_decoder()
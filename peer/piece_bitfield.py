@@ -0,0 +1,140 @@
+"""
+    Packed bitfield of the pieces of a torrent
+
+    -------------------------------------------------
+    | byte 0          | byte 1          | ...       |
+    | piece 0 ... 7   | piece 8 ... 15  | ...       |
+    -------------------------------------------------
+
+    One bit per piece, the high bit of the first byte is piece 0, exactly as in
+    the BITFIELD message of the Peer Wire Protocol, so the bits are sent to and
+    taken from the wire as they are. Spare bits after the last piece are always 0.
+    Counting and combining bitfields converts the bytes to one python int, which
+    is done in C instead of looping over the pieces.
+"""
+
+# offsets of the set bits of every byte value, high bit first
+BYTE_SET_BITS = tuple(tuple(bit for bit in range(8) if byte & (0x80 >> bit)) for byte in range(256))
+
+
+class Piece_bitfield():
+    __slots__ = ("length", "bits")
+
+    def __init__(self, length, bits=None):
+        # number of pieces
+        self.length = length
+        # packed bits, padded to whole bytes
+        self.bits = bytearray((length + 7) // 8) if bits is None else bits
+
+    # bitfield with every piece set
+    @classmethod
+    def full(cls, length):
+        bitfield = cls(length, bytearray(b'\xff' * ((length + 7) // 8)))
+        bitfield.clear_spare_bits()
+        return bitfield
+
+    # bitfield of a list of 0/1 ints
+    @classmethod
+    def from_list(cls, bit_list):
+        bitfield = cls(len(bit_list))
+        for index, bit in enumerate(bit_list):
+            if bit:
+                bitfield.bits[index >> 3] |= 0x80 >> (index & 7)
+        return bitfield
+
+    # bitfield of a BITFIELD message payload, the payload is copied
+    @classmethod
+    def from_payload(cls, payload, length):
+        byte_length = (length + 7) // 8
+        if len(payload) < byte_length:
+            raise ValueError(f"Bitfield payload of {len(payload)} bytes is too short for {length} pieces")
+        bitfield = cls(length, bytearray(payload[:byte_length]))
+        bitfield.clear_spare_bits()
+        return bitfield
+
+    # bitfield as saved in the torrent log, a hex string or a legacy list of 0/1 ints
+    @classmethod
+    def load(cls, value, length):
+        if isinstance(value, Piece_bitfield):
+            return value
+        if isinstance(value, str):
+            return cls.from_payload(bytes.fromhex(value), length)
+        return cls.from_list(list(value)[:length] + [0] * (length - len(value)))
+
+    def clear_spare_bits(self):
+        spare_bits = len(self.bits) * 8 - self.length
+        if spare_bits:
+            self.bits[-1] &= (0xff << spare_bits) & 0xff
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.length:
+            raise IndexError(f"Piece index {index} out of range")
+        return (self.bits[index >> 3] >> (7 - (index & 7))) & 1
+
+    def __setitem__(self, index, value):
+        if not 0 <= index < self.length:
+            raise IndexError(f"Piece index {index} out of range")
+        if value:
+            self.bits[index >> 3] |= 0x80 >> (index & 7)
+        else:
+            self.bits[index >> 3] &= ~(0x80 >> (index & 7)) & 0xff
+
+    # iterates the bit of every piece, 0 or 1
+    def __iter__(self):
+        for index in range(self.length):
+            yield (self.bits[index >> 3] >> (7 - (index & 7))) & 1
+
+    def __eq__(self, other):
+        return isinstance(other, Piece_bitfield) and self.length == other.length and self.bits == other.bits
+
+    def to_int(self):
+        return int.from_bytes(self.bits, 'big')
+
+    def of_int(self, value):
+        return Piece_bitfield(self.length, bytearray(value.to_bytes(len(self.bits), 'big')))
+
+    # number of pieces set
+    def count(self):
+        return self.to_int().bit_count()
+
+    def is_complete(self):
+        return self.count() == self.length
+
+    # pieces set in both bitfields
+    def __and__(self, other):
+        return self.of_int(self.to_int() & other.to_int())
+
+    # pieces set in this bitfield but not in the other, e.g. pieces the peer has that the client lacks
+    def and_not(self, other):
+        return self.of_int(self.to_int() & ~other.to_int())
+
+    # iterates the indexes of the pieces set
+    def set_bits(self):
+        for byte_index, byte in enumerate(self.bits):
+            if byte:
+                base = byte_index << 3
+                for bit in BYTE_SET_BITS[byte]:
+                    yield base + bit
+
+    # the BITFIELD message payload, a view of the bits
+    def payload(self):
+        return memoryview(self.bits)
+
+    # the bitfield as saved in the torrent log
+    def hex(self):
+        return self.bits.hex()
+
+    def to_list(self):
+        return list(self)
+
+    def copy(self):
+        return Piece_bitfield(self.length, bytearray(self.bits))
+
+    def __str__(self):
+        return f"{self.count()}/{self.length} pieces"
+
+    def __repr__(self):
+        return f"Piece_bitfield({self.length}, {self.hex()})"
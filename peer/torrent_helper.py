@@ -6,6 +6,7 @@ import bencodepy
 from beautifultable import BeautifulTable
 import os
 import shutil
+from piece_bitfield import Piece_bitfield
 
 PIECE_LENGTH = 512 * (2 ** 10)  # 512 KB
 BLOCK_SIZE = 16 * (2 ** 10) # 16 KB
@@ -305,7 +306,7 @@ def generate_torrent_file(torrent_manager, tracker_url, torrent_folder_path, inp
     pieces_count = len(pieces) // 20  # Each piece has a SHA-1 hash (20 bytes)
 
     # Update into torrent_log.json through torrent_manager and set a complete bitfield
-    bitfield = [1] * pieces_count  # This peer has all the data, so the bitfield is all 1s
+    bitfield = Piece_bitfield.full(pieces_count)  # This peer has all the data, so the bitfield is all 1s
     torrent_manager.add_torrent(
         info_hash,
         piece_size=piece_length,
@@ -6,6 +6,7 @@ import bencodepy
 
 from beautifultable import BeautifulTable
 from torrent_helper import Torrent_file_reader
+from piece_bitfield import Piece_bitfield
 
 """
     * info_hash          : unique identifier (SHA-1 hash) for each torrent
@@ -13,7 +14,8 @@ from torrent_helper import Torrent_file_reader
         * piece_count        : total number of pieces in the torrent (integer)
         * torrent_save_path  : the file path where the .torrent file is stored (string)
         * data_save_path     : the directory path where the downloaded data is saved (string)
-        * bitfield           : list of integers representing the download status of each piece (0 = not downloaded, 1 = downloaded)
+        * bitfield           : packed bitfield of the download status of each piece (0 = not downloaded, 1 = downloaded),
+                               saved as a hex string, the list of integers of older logs is still read
         * list_peers         : list of dictionaries containing information about connected peers
             * ip_address     : IP address of the peer (string)
             * port           : port number the peer is using for communication (integer)
@@ -43,6 +45,8 @@ class TorrentLog:
                 with open(self.json_path, "r") as file:
                     try:
                         self.torrent_data = json.load(file)
+                        for data in self.torrent_data.values():
+                            data["bitfield"] = Piece_bitfield.load(data["bitfield"], data["piece_count"])
                         print(f"Loaded data from {self.json_path}")
                     except json.JSONDecodeError:
                         print("Error decoding JSON file. Initializing with empty data.")
@@ -58,7 +62,7 @@ class TorrentLog:
         print("Attempting to save data to JSON file...")
         try:
             with open(self.json_path, "w") as file:
-                json.dump(self.torrent_data, file, indent=4)
+                json.dump(self.torrent_data, file, indent=4, default=lambda value: value.hex())
             print(f"Data has been saved to {self.json_path}")
         except Exception as e:
             print(f"Error saving data to JSON file: {e}")
@@ -91,7 +95,7 @@ class TorrentLog:
                     pieces_count = len(torrent_reader.pieces) // 20
                     torrent_save_path = torrent_path
                     data_save_path = os.path.join(self.data_folder_path, torrent_reader.name)
-                    bitfield = [0] * pieces_count
+                    bitfield = Piece_bitfield(pieces_count)
 
                     self.add_torrent(
                         info_hash,
@@ -107,7 +111,9 @@ class TorrentLog:
     def add_torrent(self, info_hash, piece_size, pieces_count, torrent_save_path, data_save_path, bitfield=None):
         """Add a new torrent to the log."""
         if bitfield is None:
-            bitfield = [0] * pieces_count
+            bitfield = Piece_bitfield(pieces_count)
+        else:
+            bitfield = Piece_bitfield.load(bitfield, pieces_count)
 
         with self.lock:
             try:
@@ -159,7 +165,7 @@ class TorrentLog:
 
     def get_bitfield(self, info_hash):
         """Get the bitfield of a torrent by info_hash."""
-        return self.torrent_data.get(info_hash, {}).get("bitfield", [])
+        return self.torrent_data.get(info_hash, {}).get("bitfield", Piece_bitfield(0))
 
     def print_torrent_info(self):
         """Print information about all managed .torrent files."""
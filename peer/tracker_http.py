@@ -4,12 +4,23 @@ import bencodepy
 from beautifultable import BeautifulTable
 
 from torrent_helper import process_torrent_bytes_to_folder
+from tracker_udp import Tracker_udp
 
 class Event(Enum):
     STARTED = "started"  # Event when Peer starts downloading/uploading
     STOPPED = "stopped"  # Event when Peer stops activity
     COMPLETED = "completed"  # Event when Peer finishes downloading
 
+def decode_compact_peers(raw_peers_data):
+    """Decode a compact peer list (6 bytes per peer) into [(ip, port)]."""
+    peers_list = []
+    raw_peers_list = [raw_peers_data[i:6 + i] for i in range(0, len(raw_peers_data), 6)]
+    for raw_peer_data in raw_peers_list:
+        ip = ".".join(str(int(a)) for a in raw_peer_data[0:4])
+        port = raw_peer_data[4] * 256 + raw_peer_data[5]
+        peers_list.append((ip, port))
+    return peers_list
+
 class Tracker_http():
     def __init__(self, torrent_log, peer_id, peer_ip ,peer_port, info_hash, tracker_url, torrent_folder_path):
         if not info_hash:
@@ -26,13 +37,14 @@ class Tracker_http():
 
         # Set up request information
         self.compact = 1
+        self.numwant = 50
         self.peer_id = peer_id
         self.port = peer_port
         self.uploaded = 0
         
         self.downloaded = 0
         if self.torrent_info:
-            self.downloaded = sum(self.torrent_info["bitfield"])
+            self.downloaded = self.torrent_info["bitfield"].count()
         
         self.left = 10
         if self.torrent_info:
@@ -51,6 +63,7 @@ class Tracker_http():
             'downloaded': self.downloaded,
             'left': self.left,
             'compact': self.compact,
+            'numwant': self.numwant,
             'event': self.event,
             'tracker_id': "-TK0001-0001"
         }
@@ -70,6 +83,7 @@ class Tracker_http():
 
         # Response data from tracker
         self.interval = None
+        self.min_interval = None
         self.complete = None
         self.incomplete = None
         self.peers_list = []
@@ -192,8 +206,15 @@ class Tracker_http():
         print(f"Announcing to tracker: {self.tracker_url} with event: {self.event}")
         try:
             tracker_url = self.tracker_url
-            response = requests.get(tracker_url + "/announce", params=self.request_parameters, timeout=5)
-            raw_response_dict = bencodepy.decode(response.content)
+            if tracker_url.startswith("udp://"):
+                # UDP tracker: connect + announce datagrams instead of an HTTP request
+                raw_response_dict = Tracker_udp(tracker_url).announce(
+                    self.info_hash, self.peer_id, self.port, self.event, self.left,
+                    self.downloaded, self.uploaded, self.numwant
+                )
+            else:
+                response = requests.get(tracker_url + "/announce", params=self.request_parameters, timeout=5)
+                raw_response_dict = bencodepy.decode(response.content)
             self.parse_http_tracker_response(raw_response_dict)
             return True
         except Exception as error_msg:
@@ -205,14 +226,12 @@ class Tracker_http():
         if b'interval' in raw_response_dict:
             self.interval = raw_response_dict[b'interval']
 
+        # Announcing again sooner only gets a cached reply from the tracker
+        if b'min interval' in raw_response_dict:
+            self.min_interval = raw_response_dict[b'min interval']
+
         if b'peers' in raw_response_dict:
-            self.peers_list = []
-            raw_peers_data = raw_response_dict[b'peers']
-            raw_peers_list = [raw_peers_data[i:6 + i] for i in range(0, len(raw_peers_data), 6)]
-            for raw_peer_data in raw_peers_list:
-                ip = ".".join(str(int(a)) for a in raw_peer_data[0:4])
-                port = raw_peer_data[4] * 256 + raw_peer_data[5]
-                self.peers_list.append((ip, port))
+            self.peers_list = decode_compact_peers(raw_response_dict[b'peers'])
 
             # Update peer list in torrent_log
             self.torrent_log.update_peers_list(self.info_hash, self.peers_list)
@@ -255,4 +274,112 @@ class Tracker_http():
             peer_data = f"{self.peers_list[0][0]}:{self.peers_list[0][1]}... ({len(self.peers_list) - 1} more peers)"
             tracker_table.rows.append(['Peers', peer_data])
 
-        return str(tracker_table)
\ No newline at end of file
+        return str(tracker_table)
+
+class Tracker_http_batch():
+    """
+    Announce many torrents of this peer in one request to the tracker's
+    /batch_announce, instead of one Tracker_http request per info_hash.
+    """
+    def __init__(self, torrent_log, peer_id, peer_port, tracker_url, numwant=50):
+        self.torrent_log = torrent_log
+        self.peer_id = peer_id
+        self.port = peer_port
+        self.tracker_url = tracker_url
+        self.numwant = numwant
+
+        # (info_hash, event, left) of every torrent to announce
+        self.entries = []
+
+        # Response data from tracker
+        self.interval = None
+        self.tracker_id = None
+        self.responses = {}
+        self.failures = {}
+
+    def add_torrent(self, info_hash, event):
+        """Queue an announce of info_hash, with left taken from the torrent log like Tracker_http."""
+        if event not in [e.value for e in Event]:
+            raise ValueError(f"Invalid event: {event}")
+
+        left = 10
+        torrent_info = self.torrent_log.torrent_data.get(info_hash)
+        if torrent_info:
+            left = torrent_info["piece_count"] - torrent_info["bitfield"].count()
+        if event == Event.COMPLETED.value:
+            left = 0
+        self.entries.append((info_hash, event, left))
+
+    def request_announce(self):
+        """Send all queued announces and process the per-torrent responses."""
+        if not self.entries:
+            raise ValueError("No torrents added to the batch announce.")
+        print(f"Announcing {len(self.entries)} torrents to tracker: {self.tracker_url}")
+        try:
+            if self.tracker_url.startswith("udp://"):
+                # The UDP protocol has no batch announce, send one announce per torrent
+                tracker_udp = Tracker_udp(self.tracker_url)
+                for info_hash, event, left in self.entries:
+                    self.parse_torrent_response(info_hash, tracker_udp.announce(
+                        info_hash, self.peer_id, self.port, event, left, numwant=self.numwant
+                    ))
+                return True
+
+            body = bencodepy.encode({
+                b'peer_id': self.peer_id.encode('utf-8'),
+                b'port': self.port,
+                b'numwant': self.numwant,
+                b'entries': [
+                    {b'info_hash': info_hash.encode('utf-8'), b'event': event.encode('utf-8'), b'left': left}
+                    for info_hash, event, left in self.entries
+                ]
+            })
+            response = requests.post(self.tracker_url + "/batch_announce", data=body, timeout=10,
+                                     headers={'Content-Type': 'application/octet-stream'})
+            if response.status_code != 200:
+                print(f"Tracker responded with error status code {response.status_code}: {response.content[:200]}")
+                return False
+
+            raw_response_dict = bencodepy.decode(response.content)
+            self.interval = raw_response_dict.get(b'interval')
+            self.tracker_id = raw_response_dict.get(b'tracker id')
+            for raw_info_hash, raw_torrent_response in raw_response_dict.get(b'files', {}).items():
+                self.parse_torrent_response(raw_info_hash.decode('utf-8'), raw_torrent_response)
+            return True
+        except Exception as error_msg:
+            print(f"Error while announcing to tracker: {error_msg}")
+            return False
+
+    def parse_torrent_response(self, info_hash, raw_torrent_response):
+        if b'failure reason' in raw_torrent_response:
+            self.failures[info_hash] = raw_torrent_response[b'failure reason']
+            return
+
+        peers_list = decode_compact_peers(raw_torrent_response.get(b'peers', b''))
+        if b'interval' in raw_torrent_response:
+            self.interval = raw_torrent_response[b'interval']
+        self.responses[info_hash] = {
+            'interval': self.interval,
+            'peers': peers_list,
+            'leechers': raw_torrent_response.get(b'incomplete'),
+            'seeders': raw_torrent_response.get(b'complete')
+        }
+
+        # Update peer list in torrent_log
+        self.torrent_log.update_peers_list(info_hash, peers_list)
+
+    def get_peers_data(self, info_hash):
+        """Get the peer information of one torrent from the batch response."""
+        return self.responses.get(info_hash)
+
+    def __str__(self):
+        tracker_table = BeautifulTable()
+        tracker_table.columns.header = ["Info Hash", "Seeders", "Leechers", "Peers"]
+
+        for info_hash, peers_data in self.responses.items():
+            tracker_table.rows.append([info_hash, str(peers_data['seeders']), str(peers_data['leechers']),
+                                       str(len(peers_data['peers']))])
+        for info_hash, failure_reason in self.failures.items():
+            tracker_table.rows.append([info_hash, "-", "-", f"Failed: {failure_reason.decode('utf-8', 'replace')}"])
+
+        return str(tracker_table)
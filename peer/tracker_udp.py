@@ -0,0 +1,87 @@
+import random
+import socket
+import struct
+from urllib.parse import urlparse
+
+"""
+    Client for the UDP tracker protocol (BEP 15), used by Tracker_http when the
+    tracker URL has the udp:// scheme. An announce is two small datagram exchanges:
+    connect, to obtain a connection id, then announce itself.
+"""
+
+PROTOCOL_ID = 0x41727101980
+
+ACTION_CONNECT = 0
+ACTION_ANNOUNCE = 1
+ACTION_ERROR = 3
+
+# Event codes of the UDP announce request
+EVENT_CODES = {None: 0, "completed": 1, "started": 2, "stopped": 3}
+
+CONNECT_REQUEST = struct.Struct("!QII")
+CONNECT_RESPONSE = struct.Struct("!IIQ")
+ANNOUNCE_REQUEST = struct.Struct("!QII20s20sQQQIIIiH")
+ANNOUNCE_RESPONSE = struct.Struct("!IIIII")
+ACTION_HEADER = struct.Struct("!II")
+
+
+class Tracker_udp():
+    def __init__(self, tracker_url, timeout=5, retries=2):
+        parsed_url = urlparse(tracker_url)
+        if parsed_url.scheme != "udp":
+            raise ValueError(f"Not a UDP tracker URL: {tracker_url}")
+
+        self.tracker_address = (parsed_url.hostname, parsed_url.port)
+        self.timeout = timeout
+        self.retries = retries
+
+    def exchange(self, udp_socket, request, transaction_id, expected_action):
+        """Send request and wait for the response with the same transaction id, retrying on timeout."""
+        for _ in range(self.retries + 1):
+            udp_socket.sendto(request, self.tracker_address)
+            try:
+                while True:
+                    response, _ = udp_socket.recvfrom(65536)
+                    if len(response) < ACTION_HEADER.size:
+                        continue
+                    action, response_transaction_id = ACTION_HEADER.unpack_from(response)
+                    if response_transaction_id != transaction_id:
+                        continue
+                    if action == ACTION_ERROR:
+                        raise ValueError(f"UDP tracker error: {response[ACTION_HEADER.size:].decode('utf-8', 'replace')}")
+                    if action != expected_action:
+                        raise ValueError(f"Unexpected UDP tracker action {action}")
+                    return response
+            except socket.timeout:
+                continue
+        raise TimeoutError(f"UDP tracker {self.tracker_address[0]}:{self.tracker_address[1]} did not respond")
+
+    def announce(self, info_hash, peer_id, port, event, left, downloaded=0, uploaded=0, numwant=-1):
+        """
+        Announce to the UDP tracker. Returns the response as a dictionary with the
+        same keys as a decoded HTTP tracker response, so it can be parsed the same way.
+        """
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
+            udp_socket.settimeout(self.timeout)
+
+            transaction_id = random.getrandbits(32)
+            request = CONNECT_REQUEST.pack(PROTOCOL_ID, ACTION_CONNECT, transaction_id)
+            response = self.exchange(udp_socket, request, transaction_id, ACTION_CONNECT)
+            _, _, connection_id = CONNECT_RESPONSE.unpack_from(response)
+
+            transaction_id = random.getrandbits(32)
+            request = ANNOUNCE_REQUEST.pack(
+                connection_id, ACTION_ANNOUNCE, transaction_id,
+                bytes.fromhex(info_hash), peer_id.encode('utf-8')[:20].ljust(20, b"\0"),
+                downloaded, left, uploaded, EVENT_CODES[event],
+                0, random.getrandbits(32), numwant, port
+            )
+            response = self.exchange(udp_socket, request, transaction_id, ACTION_ANNOUNCE)
+
+        _, _, interval, leechers, seeders = ANNOUNCE_RESPONSE.unpack_from(response)
+        return {
+            b'interval': interval,
+            b'complete': seeders,
+            b'incomplete': leechers,
+            b'peers': response[ANNOUNCE_RESPONSE.size:]
+        }
@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+import http.client
+from urllib.parse import urlencode, urlparse
+import bencodepy
+from beautifultable import BeautifulTable
+
+from tracker import TrackerHTTPServer
+
+"""
+    Load generator for the tracker. It starts a TrackerHTTPServer on loopback (or
+    targets a running tracker with --tracker-url) and replays a fixed, pre-generated
+    workload from several client threads:
+
+        * N virtual peers, each one an endpoint 127.0.0.1:<port> joined to one of M torrents
+        * announces whose event is drawn from the event mix, e.g. started=70,completed=20,stopped=10
+        * torrent uploads through the multipart POST /announce
+
+    Requests are generated before the clock starts, so the measured time is spent
+    on the wire and in the tracker only. The report gives the throughput and the
+    p50/p99 latency of every endpoint. --output saves it as JSON and --baseline
+    prints the change against such a saved report.
+
+    Example:
+        python benchmark_tracker.py --peers 2000 --torrents 50 --requests 20000 --uploads 100
+"""
+
+DEFAULT_EVENT_MIX = "started=70,completed=20,stopped=10"
+
+# Ports of the virtual peers start here, one port per peer
+FIRST_PEER_PORT = 10000
+
+# Number of pieces of the generated torrents
+BENCHMARK_PIECE_COUNT = 64
+
+
+def parse_event_mix(event_mix):
+    """Parse "event=weight,..." into ([events], [weights])."""
+    events, weights = [], []
+    for part in event_mix.split(","):
+        event, weight = part.split("=")
+        event = event.strip()
+        if event not in ("started", "completed", "stopped"):
+            raise ValueError(f"Unknown event in event mix: {event}")
+        events.append(event)
+        weights.append(float(weight))
+    return events, weights
+
+
+def make_torrent(index):
+    """Return (info_hash bytes, torrent bytes) of a small single file torrent."""
+    info = {
+        b"name": f"benchmark-{index}.bin".encode('utf-8'),
+        b"piece length": 262144,
+        b"length": 262144 * BENCHMARK_PIECE_COUNT,
+        b"pieces": hashlib.sha1(str(index).encode('utf-8')).digest() * BENCHMARK_PIECE_COUNT
+    }
+    torrent_bytes = bencodepy.encode({b"announce": b"http://127.0.0.1/announce", b"info": info})
+    return hashlib.sha1(bencodepy.encode(info)).digest(), torrent_bytes
+
+
+def encode_multipart(fields, torrent_bytes):
+    """Encode the form fields and the torrent file like the peer's POST /announce. Returns (content type, body)."""
+    boundary = f"benchmark{random.getrandbits(64):016x}".encode('utf-8')
+    parts = []
+    for name, value in fields.items():
+        if not isinstance(value, bytes):
+            value = str(value).encode('utf-8')
+        parts.append(b"--" + boundary + b"\r\n")
+        parts.append(f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode('utf-8'))
+        parts.append(value + b"\r\n")
+    parts.append(b"--" + boundary + b"\r\n")
+    parts.append(b'Content-Disposition: form-data; name="torrent_file"; filename="torrent.torrent"\r\n')
+    parts.append(b"Content-Type: application/octet-stream\r\n\r\n")
+    parts.append(torrent_bytes + b"\r\n")
+    parts.append(b"--" + boundary + b"--\r\n")
+    return f"multipart/form-data; boundary={boundary.decode()}", b"".join(parts)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class TrackerBenchmark:
+    def __init__(self, host, port, peers, torrents, requests, uploads, concurrency, event_mix, numwant, seed=None):
+        self.host = host
+        self.port = port
+        self.concurrency = concurrency
+        self.numwant = numwant
+        self.random = random.Random(seed)
+
+        self.torrents = [make_torrent(index) for index in range(torrents)]
+        # Virtual peer i is 127.0.0.1:FIRST_PEER_PORT + i in torrent i % M
+        self.peers = [(f"-BM0001-{index:012d}", FIRST_PEER_PORT + index, index % torrents) for index in range(peers)]
+        self.events, self.weights = parse_event_mix(event_mix)
+
+        self.operations = self.generate_operations(requests, uploads)
+        self.samples = []
+        self.samples_lock = threading.Lock()
+
+    def generate_operations(self, requests, uploads):
+        """Build the workload as a shuffled list of (endpoint, method, path, headers, body)."""
+        operations = []
+        for event in self.random.choices(self.events, self.weights, k=requests):
+            peer_id, port, torrent = self.random.choice(self.peers)
+            info_hash, _ = self.torrents[torrent]
+            left = 0 if event == "completed" else self.random.choice((0, BENCHMARK_PIECE_COUNT))
+            query = urlencode({"info_hash": info_hash.hex(), "peer_id": peer_id, "port": port,
+                               "left": left, "event": event, "numwant": self.numwant})
+            operations.append(("/announce", "GET", f"/announce?{query}", {}, None))
+
+        for _ in range(uploads):
+            peer_id, port, torrent = self.random.choice(self.peers)
+            info_hash, torrent_bytes = self.torrents[torrent]
+            content_type, body = encode_multipart(
+                {"info_hash": info_hash, "peer_id": peer_id, "port": port, "left": 0, "event": "started"},
+                torrent_bytes
+            )
+            headers = {"Content-Type": content_type, "Content-Length": str(len(body))}
+            operations.append(("POST /announce", "POST", "/announce", headers, body))
+
+        self.random.shuffle(operations)
+        return operations
+
+    def send(self, method, path, headers, body):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    def worker(self, operations):
+        samples = []
+        for endpoint, method, path, headers, body in operations:
+            started_at = time.perf_counter()
+            try:
+                status = self.send(method, path, headers, body)
+            except (OSError, http.client.HTTPException):
+                status = None
+            samples.append((endpoint, status, time.perf_counter() - started_at))
+        with self.samples_lock:
+            self.samples.extend(samples)
+
+    def run(self):
+        """Replay the workload and return the report: {endpoint: {count, errors, rps, p50_ms, p99_ms, mean_ms}}."""
+        workers = [
+            threading.Thread(target=self.worker, args=(self.operations[index::self.concurrency],))
+            for index in range(self.concurrency)
+        ]
+        started_at = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started_at
+
+        latencies = {}
+        errors = {}
+        for endpoint, status, seconds in self.samples:
+            latencies.setdefault(endpoint, []).append(seconds)
+            if status != 200:
+                errors[endpoint] = errors.get(endpoint, 0) + 1
+        latencies["total"] = [seconds for _, _, seconds in self.samples]
+        errors["total"] = sum(errors.values())
+
+        report = {}
+        for endpoint, values in latencies.items():
+            values.sort()
+            report[endpoint] = {
+                "count": len(values),
+                "errors": errors.get(endpoint, 0),
+                "rps": len(values) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "mean_ms": sum(values) / len(values) * 1000 if values else 0.0
+            }
+        return report
+
+
+def print_report(report, baseline=None):
+    table = BeautifulTable(maxwidth=120)
+    columns = ["Endpoint", "Requests", "Errors", "Req/s", "p50 ms", "p99 ms", "Mean ms"]
+    if baseline:
+        columns += ["Req/s vs base", "p99 vs base"]
+    table.columns.header = columns
+
+    for endpoint, result in report.items():
+        row = [endpoint, result["count"], result["errors"], f"{result['rps']:.1f}",
+               f"{result['p50_ms']:.2f}", f"{result['p99_ms']:.2f}", f"{result['mean_ms']:.2f}"]
+        if baseline:
+            base = baseline.get(endpoint)
+            if base and base["rps"] and base["p99_ms"]:
+                row += [f"{(result['rps'] / base['rps'] - 1) * 100:+.1f}%",
+                        f"{(result['p99_ms'] / base['p99_ms'] - 1) * 100:+.1f}%"]
+            else:
+                row += ["-", "-"]
+        table.rows.append(row)
+
+    print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure announce throughput and latency of the tracker.")
+    parser.add_argument("--peers", type=int, default=1000, help="number of virtual peers")
+    parser.add_argument("--torrents", type=int, default=20, help="number of torrents the peers are spread over")
+    parser.add_argument("--requests", type=int, default=10000, help="number of GET /announce requests")
+    parser.add_argument("--uploads", type=int, default=50, help="number of torrent uploads via POST /announce")
+    parser.add_argument("--concurrency", type=int, default=16, help="number of concurrent client threads")
+    parser.add_argument("--event-mix", default=DEFAULT_EVENT_MIX, help="weights of the announce events")
+    parser.add_argument("--numwant", type=int, default=50, help="numwant sent with every announce")
+    parser.add_argument("--workers", type=int, default=64, help="worker threads of the started tracker")
+    parser.add_argument("--port", type=int, default=22299, help="port of the started tracker")
+    parser.add_argument("--tracker-url", help="benchmark a running tracker instead of starting one")
+    parser.add_argument("--seed", type=int, help="seed of the workload generator")
+    parser.add_argument("--output", help="save the report as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a report saved with --output")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="keep the started tracker's per-client announce rate limit, all virtual peers share one ip")
+    parser.add_argument("--verbose", action="store_true", help="keep the tracker's request logging")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+
+    with tempfile.TemporaryDirectory(prefix="tracker-benchmark-") as work_folder:
+        tracker_server = None
+        if args.tracker_url:
+            parsed_url = urlparse(args.tracker_url)
+            host, port = parsed_url.hostname, parsed_url.port or 80
+        else:
+            # Keep uploaded torrents out of the source tree, and legacy torrents of the working directory out of the store
+            os.chdir(work_folder)
+            host, port = "127.0.0.1", args.port
+            rate_options = {} if args.rate_limit else {"announce_rate": None}
+            tracker_server = TrackerHTTPServer("-TK0001-0001", host, port, args.workers,
+                                               state_folder=os.path.join(work_folder, "state"),
+                                               torrent_store_folder=os.path.join(work_folder, "torrents"), **rate_options)
+
+        print(f"Generating {args.requests} announces and {args.uploads} uploads "
+              f"for {args.peers} peers in {args.torrents} torrents")
+        benchmark = TrackerBenchmark(host, port, args.peers, args.torrents, args.requests, args.uploads,
+                                     args.concurrency, args.event_mix, args.numwant, args.seed)
+
+        with open(os.devnull, "w") as devnull:
+            # The tracker logs every request, which would drown the report
+            quiet = contextlib.ExitStack()
+            if not args.verbose:
+                quiet.enter_context(contextlib.redirect_stdout(devnull))
+                quiet.enter_context(contextlib.redirect_stderr(devnull))
+            with quiet:
+                if tracker_server:
+                    tracker_server.start()
+                try:
+                    report = benchmark.run()
+                finally:
+                    if tracker_server:
+                        tracker_server.stop()
+
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
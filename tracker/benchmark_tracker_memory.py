@@ -0,0 +1,111 @@
+import io
+import gc
+import time
+import heapq
+import socket
+import argparse
+import tracemalloc
+import contextlib
+
+from tracker import Tracker, PEER_TTL
+
+"""
+    Memory benchmark of the tracker state. It fills the same swarms twice and
+    measures the allocated bytes with tracemalloc:
+
+        * dict layout   : the previous layout, one dict per peer keyed by an (ip, port)
+                          tuple and referenced from the complete/incomplete sets, the
+                          slots dict and the order list, with a set per peer_index entry
+        * record layout : the current Tracker, PeerRecord objects keyed by their
+                          6-byte compact endpoint
+
+    Example:
+        python benchmark_tracker_memory.py --peers 500000 --torrents 2000
+"""
+
+
+def generate_peers(peers, torrents, seeder_ratio):
+    """Yield (info_hash, peer_id, ip, port, left) for peers spread over the torrents."""
+    info_hashes = [f"{index:040x}" for index in range(torrents)]
+    seeder_every = max(int(round(1 / seeder_ratio)), 1) if seeder_ratio else 0
+    for index in range(peers):
+        ip = socket.inet_ntoa((0x0A000000 + index // 100).to_bytes(4, 'big'))
+        port = 6881 + index % 100
+        left = 0 if seeder_every and index % seeder_every == 0 else 1024
+        yield info_hashes[index % torrents], f"-PC0001-{index:012d}", ip, port, left
+
+
+def build_dict_layout(peers):
+    """Build the dict based state the tracker used before PeerRecord."""
+    tracker_state = {}
+    peer_index = {}
+    expiry_heap = []
+    now = time.time()
+    for info_hash, peer_id, ip, port, left in peers:
+        state = tracker_state.get(info_hash)
+        if state is None:
+            state = tracker_state[info_hash] = {
+                "complete": set(), "incomplete": set(), "peers": {},
+                "compact": bytearray(), "slots": {}, "order": [], "downloaded": 0
+            }
+        key = (ip, port)
+        expires_at = now + PEER_TTL
+        state["peers"][key] = {"peer_id": peer_id, "ip": ip, "port": port, "left": left,
+                               "last_seen": now, "expires_at": expires_at}
+        peer_index.setdefault(key, set()).add(info_hash)
+        state["slots"][key] = len(state["order"])
+        state["order"].append(key)
+        state["compact"] += socket.inet_aton(ip) + port.to_bytes(2, 'big')
+        state["complete" if left == 0 else "incomplete"].add(key)
+        heapq.heappush(expiry_heap, (expires_at, info_hash, key))
+    return tracker_state, peer_index, expiry_heap
+
+
+def build_record_layout(peers):
+    tracker = Tracker("-TK0001-0001")
+    now = time.time()
+    # The tracker prints every announce
+    with contextlib.redirect_stdout(io.StringIO()):
+        for info_hash, peer_id, ip, port, left in peers:
+            tracker.apply_announce(info_hash, peer_id, ip, port, "started", left, now)
+    return tracker
+
+
+def measure(build, peers):
+    """Return the bytes still allocated by build(peers) once it returned."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        state = build(peers)
+        gc.collect()
+        allocated = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del state
+    return allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory of the dict and record tracker layouts.")
+    parser.add_argument("--peers", type=int, default=200000, help="number of tracked peers")
+    parser.add_argument("--torrents", type=int, default=1000, help="number of swarms the peers are spread over")
+    parser.add_argument("--seeder-ratio", type=float, default=0.3, help="fraction of complete peers")
+    args = parser.parse_args()
+
+    # The peers are generated up front, so their strings are not counted for either layout
+    peers = list(generate_peers(args.peers, args.torrents, args.seeder_ratio))
+
+    results = [
+        ("dict layout", measure(build_dict_layout, peers)),
+        ("record layout", measure(build_record_layout, peers)),
+    ]
+
+    print(f"{args.peers} peers in {args.torrents} swarms")
+    for name, allocated in results:
+        print(f"{name:14}: {allocated / 2 ** 20:8.1f} MiB, {allocated / args.peers:6.1f} bytes per peer")
+    print(f"record layout uses {results[1][1] / results[0][1] * 100:.0f}% of the dict layout")
+
+
+if __name__ == "__main__":
+    main()
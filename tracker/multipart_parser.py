@@ -0,0 +1,267 @@
+import os
+import mmap
+import hashlib
+import tempfile
+
+"""
+    Streaming multipart/form-data parser for tracker uploads.
+
+    The request body is read from the socket in fixed size chunks and is never held
+    in memory as a whole. Form fields are kept in memory (bounded by MAX_FIELD_SIZE),
+    while file parts are written straight into temporary files in the given folder,
+    so memory use stays bounded by CHUNK_SIZE whatever the size of the upload.
+"""
+
+# Bytes read from the request body per recv
+CHUNK_SIZE = 64 * 1024
+
+# Maximum size of the headers of one part and of one in-memory form field
+MAX_HEADER_SIZE = 8 * 1024
+MAX_FIELD_SIZE = 64 * 1024
+
+
+class MultipartStreamParser:
+    def __init__(self, boundary, file_folder):
+        self.delimiter = b"--" + boundary
+        # Delimiter between two parts, the CRLF before it belongs to the delimiter
+        self.part_delimiter = b"\r\n" + self.delimiter
+        self.file_folder = file_folder
+
+    def read_chunks(self, stream, content_length):
+        remaining = content_length
+        while remaining > 0:
+            chunk = stream.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise ValueError("Request body ended before Content-Length bytes were received")
+            remaining -= len(chunk)
+            yield chunk
+
+    def parse(self, stream, content_length):
+        """
+        Parse the multipart body of content_length bytes from stream.
+        Returns (payload, files): payload maps field names to bytes, files maps
+        field names to the paths of the temporary files holding their content.
+        The caller owns the temporary files and must move or delete them.
+        """
+        payload = {}
+        files = {}
+        try:
+            self.parse_parts(self.read_chunks(stream, content_length), payload, files)
+        except Exception:
+            for path in files.values():
+                remove_file(path)
+            raise
+        return payload, files
+
+    def parse_parts(self, chunks, payload, files):
+        buffer = bytearray()
+        chunks = iter(chunks)
+
+        def fill():
+            chunk = next(chunks, None)
+            if chunk is None:
+                return False
+            buffer.extend(chunk)
+            return True
+
+        # Skip the preamble up to the first delimiter
+        while True:
+            index = buffer.find(self.delimiter)
+            if index >= 0:
+                del buffer[:index + len(self.delimiter)]
+                break
+            # Keep a tail that may hold the beginning of the delimiter
+            del buffer[:max(0, len(buffer) - len(self.delimiter))]
+            if not fill():
+                raise ValueError("Multipart body has no boundary")
+
+        while True:
+            # After a delimiter: "--" closes the body, CRLF starts a new part
+            while len(buffer) < 2:
+                if not fill():
+                    raise ValueError("Multipart body ended after a boundary")
+            if buffer[:2] == b"--":
+                return
+
+            # Read the headers of the part
+            while True:
+                index = buffer.find(b"\r\n\r\n")
+                if index >= 0:
+                    headers = bytes(buffer[2:index]).decode('utf-8', 'replace')
+                    del buffer[:index + 4]
+                    break
+                if len(buffer) > MAX_HEADER_SIZE:
+                    raise ValueError("Multipart part headers are too large")
+                if not fill():
+                    raise ValueError("Multipart body ended inside part headers")
+
+            name, is_file = parse_content_disposition(headers)
+            if is_file:
+                file_descriptor, path = tempfile.mkstemp(dir=self.file_folder, suffix=".part")
+                if name in files:
+                    remove_file(files[name])
+                files[name] = path
+                with os.fdopen(file_descriptor, "wb") as sink:
+                    self.read_part_body(buffer, fill, sink.write)
+            else:
+                value = bytearray()
+
+                def append_field(data):
+                    if len(value) + len(data) > MAX_FIELD_SIZE:
+                        raise ValueError(f"Multipart field {name} is too large")
+                    value.extend(data)
+
+                self.read_part_body(buffer, fill, append_field)
+                if name is not None:
+                    payload[name] = bytes(value)
+
+    def read_part_body(self, buffer, fill, write):
+        """Pass the body of the current part to write, and consume its closing delimiter."""
+        keep = len(self.part_delimiter) - 1
+        while True:
+            index = buffer.find(self.part_delimiter)
+            if index >= 0:
+                write(bytes(buffer[:index]))
+                del buffer[:index + len(self.part_delimiter)]
+                return
+            # Everything except a possible partial delimiter at the end belongs to the body
+            if len(buffer) > keep:
+                write(bytes(buffer[:len(buffer) - keep]))
+                del buffer[:len(buffer) - keep]
+            if not fill():
+                raise ValueError("Multipart body ended inside a part")
+
+
+def parse_content_disposition(headers):
+    """Return (name, is_file) from the Content-Disposition header of a part."""
+    for line in headers.split("\r\n"):
+        if line.lower().startswith("content-disposition:"):
+            name = None
+            if 'name="' in line:
+                name = line.split('name="')[1].split('"')[0]
+            return name, "filename=" in line
+    return None, False
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def validate_torrent_file(path):
+    """
+    Check that the file holds exactly one well formed bencoded dictionary with an
+    "info" dictionary, without loading its strings into memory. The file is mapped
+    and walked iteratively, only dictionary keys and the name are copied out.
+    Returns (info_hash, name, size, piece count), the info_hash being the sha1 of
+    the raw info dictionary bytes.
+    Raises ValueError if the file is not a valid torrent.
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise ValueError("Torrent file is empty")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            info_start, info_end, name, size, piece_count = validate_torrent_bytes(data)
+            with memoryview(data) as view, view[info_start:info_end] as info_view:
+                info_hash = hashlib.sha1(info_view).hexdigest()
+    return info_hash, name, size, piece_count
+
+
+def validate_torrent_bytes(data):
+    """
+    Walk a bencoded torrent. Returns (info start, info end, name, size, piece count),
+    info start and end delimiting the raw info dictionary. The pieces string is
+    only measured, never copied.
+    """
+    size = len(data)
+    if data[0:1] != b"d":
+        raise ValueError("Torrent file is not a bencoded dictionary")
+
+    # Each frame is [is_dict, expecting_key, last key], keys are only kept where the catalog needs them
+    stack = []
+    position = 0
+    info_start = info_end = None
+    name = b""
+    length = None
+    files_length = None
+    piece_count = None
+
+    while True:
+        if position >= size:
+            raise ValueError("Truncated bencoded data")
+        token = data[position:position + 1]
+        frame = stack[-1] if stack else None
+        is_key = frame is not None and frame[0] and frame[1]
+        depth = len(stack)
+        # Where the value being read sits: in the info dictionary, or in one of its files
+        in_info = depth == 2 and stack[0][2] == b"info" and stack[1][0]
+        in_file = depth == 4 and stack[0][2] == b"info" and stack[1][2] == b"files" and stack[3][0]
+
+        if token == b"e":
+            if frame is None or (frame[0] and not frame[1]):
+                raise ValueError(f"Unexpected end marker at {position}")
+            stack.pop()
+            position += 1
+            if in_info:
+                info_end = position
+            if not stack:
+                break
+            stack[-1][1] = stack[-1][0] and not stack[-1][1]
+            continue
+
+        if is_key and not token.isdigit():
+            raise ValueError(f"Dictionary key is not a string at {position}")
+
+        value_start = position
+        if token == b"i":
+            end = data.find(b"e", position + 1)
+            if end < 0:
+                raise ValueError(f"Unterminated integer at {position}")
+            try:
+                value = int(data[position + 1:end])
+            except ValueError:
+                raise ValueError(f"Invalid integer at {position}")
+            if in_info and frame[2] == b"length":
+                length = value
+            elif in_file and frame[2] == b"length":
+                files_length = (files_length or 0) + value
+            position = end + 1
+        elif token.isdigit():
+            colon = data.find(b":", position)
+            if colon < 0 or colon - position > 20:
+                raise ValueError(f"Invalid string length at {position}")
+            string_length = int(data[position:colon])
+            position = colon + 1 + string_length
+            if position > size:
+                raise ValueError(f"String at {value_start} runs past the end of the file")
+            if is_key:
+                if depth in (1, 2, 4):
+                    frame[2] = data[colon + 1:position]
+            elif in_info and frame[2] == b"pieces":
+                piece_count = string_length // 20
+            elif in_info and frame[2] == b"name":
+                name = data[colon + 1:position]
+        elif token == b"l" or token == b"d":
+            if depth == 1 and frame[2] == b"info" and not is_key and token == b"d":
+                info_start = position
+            stack.append([token == b"d", True, None])
+            position += 1
+            continue
+        else:
+            raise ValueError(f"Invalid bencode token at {position}")
+
+        # A scalar was consumed, a dictionary alternates between key and value
+        if stack[-1][0]:
+            stack[-1][1] = not stack[-1][1]
+
+    if position != size:
+        raise ValueError("Trailing data after the torrent dictionary")
+    if info_start is None or info_end is None:
+        raise ValueError("Torrent file has no info dictionary")
+    if piece_count is None:
+        raise ValueError("Torrent info has no pieces")
+    if length is None and files_length is None:
+        raise ValueError("Torrent info has neither length nor files")
+    return info_start, info_end, bytes(name), length if length is not None else files_length, piece_count
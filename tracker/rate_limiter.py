@@ -0,0 +1,54 @@
+import time
+import threading
+from collections import OrderedDict
+
+"""
+    Per-client token buckets limiting how often clients may announce.
+
+    buckets = OrderedDict{client: [tokens, last refill time]}, least recently seen first
+
+    A bucket holds at most burst tokens and refills at rate tokens per second;
+    every announce takes tokens from its client's bucket and is refused while the
+    bucket is short. Buckets are refilled lazily when their client comes back, so
+    idle clients cost nothing but their entry. At most max_clients buckets are
+    kept: the least recently seen client is forgotten first, which only gives it
+    a full bucket again.
+"""
+
+# Default number of clients with a bucket
+DEFAULT_MAX_CLIENTS = 100000
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate, burst, max_clients=DEFAULT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, client, cost=1, now=None):
+        """
+        Take cost tokens from the bucket of client. Returns 0 if they were taken,
+        otherwise the seconds until the bucket holds enough tokens.
+        """
+        if now is None:
+            now = time.monotonic()
+        # A request costing more than a full bucket would never pass
+        cost = min(cost, self.burst)
+
+        with self.lock:
+            bucket = self.buckets.get(client)
+            if bucket is None:
+                bucket = self.buckets[client] = [self.burst, now]
+                if len(self.buckets) > self.max_clients:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0
+            return (cost - bucket[0]) / self.rate
@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+
+"""
+    Size bounded LRU cache of .torrent file bytes served by /get_torrent.
+
+    * entries     : info_hash -> (torrent bytes, etag), least recently used first
+    * generations : info_hash -> counter bumped by every invalidation. A reader notes
+                    the generation before reading the file from disk and the cache
+                    refuses its result if the file was rewritten in the meantime.
+    * seen_once   : info_hashes that missed once. A torrent is only admitted on its
+                    second miss, so torrents fetched a single time are streamed with
+                    sendfile and never evict popular ones.
+"""
+
+# Total bytes of torrent files kept in memory
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# Torrent files larger than this are always streamed from disk
+DEFAULT_MAX_ENTRY_BYTES = 4 * 1024 * 1024
+
+# Number of remembered single misses
+MAX_SEEN_ONCE = 100000
+
+
+def make_etag(stat_result):
+    """ETag of a torrent file derived from its modification time and size."""
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+class TorrentFileCache:
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, max_entry_bytes=DEFAULT_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.current_bytes = 0
+
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.seen_once = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, info_hash):
+        """Return (torrent bytes, etag) of a cached torrent, or None on a miss."""
+        with self.lock:
+            entry = self.entries.get(info_hash)
+            if entry is not None:
+                self.entries.move_to_end(info_hash)
+            return entry
+
+    def generation(self, info_hash):
+        with self.lock:
+            return self.generations.get(info_hash, 0)
+
+    def should_admit(self, info_hash, size):
+        """Decide on a miss whether the file should be read into the cache."""
+        if size > self.max_entry_bytes:
+            return False
+        with self.lock:
+            if info_hash in self.seen_once:
+                del self.seen_once[info_hash]
+                return True
+            self.seen_once[info_hash] = True
+            if len(self.seen_once) > MAX_SEEN_ONCE:
+                self.seen_once.popitem(last=False)
+            return False
+
+    def put(self, info_hash, torrent_bytes, etag, generation):
+        """Cache torrent bytes read while the torrent was at the given generation."""
+        size = len(torrent_bytes)
+        if size > self.max_entry_bytes:
+            return
+        with self.lock:
+            # The file was rewritten while it was being read
+            if self.generations.get(info_hash, 0) != generation:
+                return
+
+            old_entry = self.entries.pop(info_hash, None)
+            if old_entry is not None:
+                self.current_bytes -= len(old_entry[0])
+
+            self.entries[info_hash] = (torrent_bytes, etag)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (evicted_bytes, _) = self.entries.popitem(last=False)
+                self.current_bytes -= len(evicted_bytes)
+
+    def invalidate(self, info_hash):
+        """Drop a torrent whose file is being rewritten."""
+        with self.lock:
+            self.generations[info_hash] = self.generations.get(info_hash, 0) + 1
+            entry = self.entries.pop(info_hash, None)
+            if entry is not None:
+                self.current_bytes -= len(entry[0])
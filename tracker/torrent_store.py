@@ -0,0 +1,157 @@
+import os
+import bisect
+import shutil
+import threading
+
+from multipart_parser import validate_torrent_file
+
+"""
+    Content addressed store of the uploaded .torrent files and the in-memory
+    catalog of what it holds.
+
+    root/
+        incoming/                       : uploads being received, moved into place once valid
+        ab/cd/abcd...ef.torrent         : torrent files sharded by the first two bytes of their info_hash
+
+    A torrent is stored under the sha1 of its info dictionary, so an upload is only
+    accepted if its content matches the info_hash it was announced with. Sharding
+    keeps every directory small with tens of thousands of torrents. Torrents are
+    hashed and cataloged by the mapped walk of validate_torrent_file, they are
+    never decoded into memory.
+
+    The flat folder of older trackers is imported once, LEGACY_IMPORT_MARKER is
+    then written to the root. A cluster node only imports the torrents it owns,
+    the others are left for their owners.
+
+    * catalog     : info_hash -> (name, size, piece count), built once at startup by
+                    scanning the store and kept up to date by every upload
+    * info_hashes : sorted info_hashes of the catalog, pages of the listing are cut
+                    from it with a bisect on the last info_hash of the previous page
+"""
+
+INCOMING_FOLDER_NAME = "incoming"
+LEGACY_IMPORT_MARKER = "legacy_imported"
+TORRENT_SUFFIX = ".torrent"
+
+# Torrents listed per page by default and at most
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+def is_info_hash(info_hash):
+    return len(info_hash) == 40 and set(info_hash) <= HEX_DIGITS
+
+
+def read_catalog_entry(torrent_path):
+    """Return (info_hash, (name, size, piece count)) of a torrent file. Raises ValueError if it is malformed."""
+    info_hash, name, size, piece_count = validate_torrent_file(torrent_path)
+    return info_hash, (name.decode('utf-8', errors='replace'), size, piece_count)
+
+
+class TorrentStore:
+    def __init__(self, root, legacy_folder=None, owns=None):
+        self.root = root
+        self.incoming_folder = os.path.join(root, INCOMING_FOLDER_NAME)
+        self.catalog = {}
+        self.info_hashes = []
+        self.lock = threading.Lock()
+
+        # Uploads left half written by a crash are never moved into place
+        shutil.rmtree(self.incoming_folder, ignore_errors=True)
+        os.makedirs(self.incoming_folder, exist_ok=True)
+
+        self.load_catalog()
+        marker_path = os.path.join(root, LEGACY_IMPORT_MARKER)
+        if legacy_folder and os.path.isdir(legacy_folder) and not os.path.exists(marker_path):
+            self.import_folder(legacy_folder, owns)
+            with open(marker_path, "w"):
+                pass
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def __contains__(self, info_hash):
+        return info_hash in self.catalog
+
+    def path_for(self, info_hash):
+        return os.path.join(self.root, info_hash[0:2], info_hash[2:4], info_hash + TORRENT_SUFFIX)
+
+    def load_catalog(self):
+        """Build the catalog from the torrent files found in the shard directories."""
+        for first in os.scandir(self.root):
+            if not first.is_dir() or len(first.name) != 2:
+                continue
+            for second in os.scandir(first.path):
+                if not second.is_dir():
+                    continue
+                for entry in os.scandir(second.path):
+                    info_hash = entry.name[:-len(TORRENT_SUFFIX)]
+                    if not entry.name.endswith(TORRENT_SUFFIX) or not is_info_hash(info_hash):
+                        continue
+                    try:
+                        _, self.catalog[info_hash] = read_catalog_entry(entry.path)
+                    except (OSError, ValueError) as e:
+                        print(f"Skipping unreadable torrent file {entry.path}: {e}")
+        self.info_hashes = sorted(self.catalog)
+        print(f"Torrent store at {self.root} holds {len(self.catalog)} torrents")
+
+    def import_folder(self, folder, owns=None):
+        """
+        Move the flat <info_hash>.torrent files of an older tracker into the store,
+        only those for which owns(info_hash) holds when owns is given.
+        """
+        imported = 0
+        for entry in os.scandir(folder):
+            info_hash = entry.name[:-len(TORRENT_SUFFIX)]
+            if not entry.name.endswith(TORRENT_SUFFIX) or not is_info_hash(info_hash):
+                continue
+            if owns is not None and not owns(info_hash):
+                continue
+            try:
+                self.add(info_hash, entry.path)
+                imported += 1
+            except (OSError, ValueError) as e:
+                print(f"Skipping torrent file {entry.path}: {e}")
+        if imported:
+            print(f"Imported {imported} torrent files from {folder}")
+
+    def add(self, info_hash, torrent_path):
+        """
+        Move the torrent file at torrent_path into the store under info_hash and
+        return its new path. Raises ValueError if the torrent is malformed or does
+        not hash to info_hash.
+        """
+        content_hash, catalog_entry = read_catalog_entry(torrent_path)
+        if content_hash != info_hash:
+            raise ValueError(f"Torrent info hashes to {content_hash}, not {info_hash}")
+
+        store_path = self.path_for(info_hash)
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        # Atomically move the torrent file into place, readers never see a partial file
+        try:
+            os.replace(torrent_path, store_path)
+        except OSError:
+            # Legacy files may sit on another file system
+            shutil.move(torrent_path, store_path)
+
+        with self.lock:
+            if info_hash not in self.catalog:
+                bisect.insort(self.info_hashes, info_hash)
+            self.catalog[info_hash] = catalog_entry
+        return store_path
+
+    def list(self, after=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Return one page of the catalog as ([(info_hash, name, size, piece count)], total, next),
+        starting after the info_hash after, or at the beginning. next is the after
+        of the following page, None on the last page.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        with self.lock:
+            start = bisect.bisect_right(self.info_hashes, after) if after else 0
+            page = [(info_hash, *self.catalog[info_hash]) for info_hash in self.info_hashes[start:start + limit]]
+            total = len(self.info_hashes)
+        next_after = page[-1][0] if page and start + len(page) < total else None
+        return page, total, next_after
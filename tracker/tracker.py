@@ -1,9 +1,85 @@
 import threading
 import os
+import sys
+from contextlib import contextmanager, ExitStack
+from urllib.parse import parse_qs, urlencode, urlparse
+from concurrent.futures import ThreadPoolExecutor
 from http.server import BaseHTTPRequestHandler, HTTPServer
 import bencodepy
 from beautifultable import BeautifulTable
 import socket
+import random
+import time
+import heapq
+import math
+
+from tracker_journal import TrackerJournal
+from multipart_parser import MultipartStreamParser, remove_file
+from torrent_cache import TorrentFileCache, make_etag
+from torrent_store import TorrentStore, DEFAULT_PAGE_SIZE
+from tracker_metrics import TrackerMetrics
+from udp_tracker import TrackerUDPServer
+from tracker_cluster import load_cluster_config, FORWARDED_HEADER, CLIENT_IP_HEADER, SIGNATURE_HEADER
+from rate_limiter import TokenBucketLimiter
+
+# Default number of worker threads serving HTTP requests concurrently
+DEFAULT_MAX_WORKERS = 64
+
+# Accepted connections waiting for a free worker, more are left in the kernel backlog
+MAX_QUEUED_REQUESTS = 64
+
+# Number of lock stripes the swarms are sharded over
+DEFAULT_LOCK_STRIPES = 64
+
+# Interval in seconds that peers are asked to wait between announces
+ANNOUNCE_INTERVAL = 1800
+
+# Seconds a peer must wait before announcing again, earlier re-announces get a cached reply
+MIN_ANNOUNCE_INTERVAL = 60
+
+# Seconds a cached reply of a swarm may be served, as long as no peer joins or leaves
+REPLY_CACHE_TTL = 30
+
+# Announce token bucket of every client ip: tokens refilled per second, and bucket size
+ANNOUNCE_RATE = 2.0
+ANNOUNCE_BURST = 60
+
+# Batch announce entries costing one announce token
+BATCH_ENTRIES_PER_TOKEN = 100
+
+# Size in bytes of one compact peer entry (4 bytes IPv4 + 2 bytes port)
+COMPACT_PEER_SIZE = 6
+
+# Seconds without an announce after which a peer is considered dead
+PEER_TTL = 2 * ANNOUNCE_INTERVAL
+
+# Seconds between two runs of the expired peer reaper
+REAP_INTERVAL = 60
+
+# Seconds between two snapshots of the tracker state
+SNAPSHOT_INTERVAL = 300
+
+# Folder holding the tracker snapshot and journals, next to this file
+DEFAULT_STATE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tracker_state_folder")
+
+# Folder of the torrent store, next to this file
+DEFAULT_TORRENT_STORE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "torrent_store")
+
+# Flat folder, relative to the working directory, where older trackers saved uploaded torrents
+LEGACY_TORRENT_FOLDER = "torrent_data_folder"
+
+# Number of peers returned when the client does not send numwant, and the upper bound for numwant
+DEFAULT_NUMWANT = 50
+MAX_NUMWANT = 200
+
+# Least share of numwant filled with seeders when answering a leecher
+SEEDER_SHARE = 0.5
+
+# Most torrents one /batch_announce may carry, and the largest accepted request body
+MAX_BATCH_ENTRIES = 1000
+MAX_BATCH_BODY_SIZE = 1024 * 1024
+
+ANNOUNCE_EVENTS = ("started", "completed", "stopped")
 
 
 def get_tracker_host():
@@ -21,118 +97,605 @@ def get_tracker_host():
         print(f"Error getting tracker host address: {e}")
         return "127.0.0.1"  # Return localhost if there's an error
 
+def encode_peer(ip, port):
+    """Encode peer information in compact binary format (BEP 23)."""
+    return socket.inet_aton(ip) + int(port).to_bytes(2, 'big')
+
+def decode_peer(endpoint):
+    """Decode a compact peer entry back to (ip, port)."""
+    return socket.inet_ntoa(endpoint[:4]), int.from_bytes(endpoint[4:6], 'big')
+
+def sample_compact_peers(compact, count, excluded=None):
+    """
+    Return count random entries of a compact peer array, never the entry at index
+    excluded. Costs O(count) whatever the size of the array.
+    """
+    entries = len(compact) // COMPACT_PEER_SIZE
+    candidates = entries if excluded is None else entries - 1
+    if count <= 0 or candidates <= 0:
+        return b""
+
+    view = memoryview(compact)
+    try:
+        if count >= candidates:
+            if excluded is None:
+                return bytes(compact)
+            start = excluded * COMPACT_PEER_SIZE
+            return b"".join((view[:start], view[start + COMPACT_PEER_SIZE:]))
+
+        # Draw one extra index so the excluded entry can be dropped from the sample
+        sample = random.sample(range(entries), min(count + 1, entries))
+        if excluded in sample:
+            sample.remove(excluded)
+        return b"".join(
+            view[index * COMPACT_PEER_SIZE:(index + 1) * COMPACT_PEER_SIZE]
+            for index in sample[:count]
+        )
+    finally:
+        view.release()
+
+def encode_batch_request(peer_id, port, numwant, entries):
+    """Bencode a /batch_announce request body for (info_hash, event, left) entries."""
+    return bencodepy.encode({
+        b"peer_id": peer_id.encode('utf-8'),
+        b"port": port,
+        b"numwant": numwant,
+        b"entries": [
+            {b"info_hash": info_hash.encode('utf-8'), b"event": event.encode('utf-8'), b"left": left}
+            for info_hash, event, left in entries
+        ]
+    })
+
+def encode_announce_response(complete, incomplete, peers, tracker_id, warning_message=None, min_interval=MIN_ANNOUNCE_INTERVAL):
+    """
+    Bencode an announce response directly from its parts. Keys are written in
+    the sorted order required by bencoding, and the pre-packed compact peers are
+    copied in as-is instead of going through a generic encoder.
+    """
+    parts = [
+        b"d8:completei%de10:incompletei%de8:intervali%de12:min intervali%de5:peers%d:" % (
+            complete, incomplete, ANNOUNCE_INTERVAL, min_interval, len(peers)),
+        peers,
+        b"10:tracker id%d:" % len(tracker_id),
+        tracker_id,
+    ]
+    if warning_message:
+        parts.append(b"15:warning message%d:" % len(warning_message))
+        parts.append(warning_message)
+    parts.append(b"e")
+    return b"".join(parts)
+
 '''
     tracker_state = {
         "info_hash": {
-            "complete": [list of complete peers],
-            "incomplete": [list of incomplete peers],
-            "peers": [list of all peers]
+            "peers": {endpoint: PeerRecord},
+            "seeders": bytearray of the 6-byte compact entries of the complete peers,
+            "leechers": bytearray of the 6-byte compact entries of the incomplete peers,
+            "downloaded": number of "completed" events seen for the swarm,
+            "replies": {(seeder, numwant): (expires_at, compact peers)}, only once a reply was cached
         }
     }
+
+    peer_index = {
+        endpoint: (info_hash,) for a peer in one swarm, promoted to a set of info_hashes
+                  when it joins a second one so joins and leaves stay constant time
+    }
+
+    A peer is identified by its endpoint: the 6-byte compact encoding of its
+    (ip, port) (BEP 23), which is also its entry in the swarm's seeders or
+    leechers array. Finding, updating and moving a peer between complete and
+    incomplete is a constant time operation regardless of the swarm size, and the
+    seeder/leecher counts are the array lengths. The peer_index lets a "stopped"
+    event only visit the swarms the peer actually joined.
+
+    Peers are PeerRecord objects with __slots__ instead of dicts, and no per peer
+    data is kept besides the record, its endpoint and its expiry heap entry:
+    the ip and port are decoded from the endpoint when needed, the complete flag
+    and the index in its compact array live in the record, and the info_hash
+    strings are interned so every swarm shares one copy. Run
+    benchmark_tracker_memory.py to compare with the dict based layout.
+
+    The compact peer lists of each swarm are kept pre-encoded and are only updated
+    when a peer joins, leaves or completes, so an announce response is built by
+    slicing them. A leaving peer is swapped with the last entry to keep the array
+    dense, the last entry's bytes being the endpoint of the peer that moves.
+    Keeping seeders and leechers apart lets announces pick peers by status in
+    O(numwant): seeders only get leechers back, leechers get a share of seeders
+    larger than their proportion in the swarm (see SEEDER_SHARE).
+
+    A peer re-announcing before MIN_ANNOUNCE_INTERVAL without changing its
+    status gets a reply from the swarm's "replies" cache instead, and the swarm
+    is left untouched. Cached replies live for REPLY_CACHE_TTL and are dropped as
+    soon as a peer joins, leaves or completes.
+
+    Swarms are sharded over lock stripes by info_hash. A stripe owns the lock of
+    its swarms, their expiry heap and their peer counters, so announces for
+    torrents on different stripes never contend:
+
+    stripe.expiry_heap = [(deadline, info_hash, endpoint)]
+
+    Every tracked peer has exactly one entry in its stripe's expiry heap, whose
+    deadline is stored in the peer as expires_at. Announces only refresh
+    last_seen; the reaper pops due entries and either reschedules the peer at
+    last_seen + PEER_TTL or removes it, so reaping costs O(log n) per expired or
+    refreshed peer.
+
+    stripe.total_peers and stripe.total_complete count the peers of the stripe's
+    swarms and are updated with every membership change, so tracker wide totals
+    are a sum over the stripes and never walk the swarms.
+
+    When a journal is attached, every applied announce and expiry is appended to
+    it so the state can be rebuilt after a restart (see tracker_journal.py).
+
+    Locking rules, since requests are served concurrently by the HTTP worker pool:
+        * a swarm is only read or written while holding its stripe lock
+        * peer_index is only accessed while holding index_lock
+        * a swarm membership and its peer_index entry change together: the stripe
+          lock is taken first, then index_lock, never the other way around
+        * no code holds two stripe locks at once, except lock_all_stripes() which
+          takes them all in stripe order
 '''
+class PeerRecord:
+    __slots__ = ("peer_id", "left", "last_seen", "expires_at", "slot", "complete")
+
+    def __init__(self, peer_id, left, last_seen, expires_at):
+        self.peer_id = peer_id
+        self.left = left
+        self.last_seen = last_seen
+        self.expires_at = expires_at
+        # Index of the peer's entry in the swarm's seeders or leechers array
+        self.slot = -1
+        self.complete = False
+
+class SwarmStripe:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.expiry_heap = []
+        self.total_peers = 0
+        self.total_complete = 0
+
 class Tracker:
-    def __init__(self, tracker_id):
+    def __init__(self, tracker_id, lock_stripes=DEFAULT_LOCK_STRIPES):
         self.tracker_id = tracker_id
         self.tracker_state = {}
+        self.peer_index = {}
+        self.peer_ttl = PEER_TTL
+        self.min_interval = MIN_ANNOUNCE_INTERVAL
+        self.journal = None
+        self.stripes = [SwarmStripe() for _ in range(lock_stripes)]
+        self.index_lock = threading.Lock()
+
+    def stripe_of(self, info_hash):
+        return self.stripes[hash(info_hash) % len(self.stripes)]
+
+    def stripe_lock(self, info_hash):
+        """Return the lock guarding the swarm of info_hash."""
+        return self.stripe_of(info_hash).lock
+
+    @contextmanager
+    def lock_all_stripes(self):
+        """Hold every stripe lock, for operations that need a consistent view of all swarms."""
+        with ExitStack() as stack:
+            for stripe in self.stripes:
+                stack.enter_context(stripe.lock)
+            yield
 
     def add_peer(self, info_hash, peer_id, ip, port, event, left):
+        now = time.time()
         if event == "stopped":
             # If the event is "stopped" and there is no info_hash, remove the peer by ip and port
+            self.remove_peer_by_ip_port(ip, port, journal=True)
+            return
+
+        stripe = self.stripe_of(info_hash)
+        with stripe.lock:
+            self._add_peer(stripe, info_hash, peer_id, ip, port, event, left, now)
+            if self.journal:
+                self.journal.record_announce(info_hash, peer_id, ip, port, event, left, now)
+
+    def apply_announce(self, info_hash, peer_id, ip, port, event, left, now):
+        """Apply an announce that happened at time now without journaling it, used for replay."""
+        if event == "stopped":
             self.remove_peer_by_ip_port(ip, port)
             return
 
-        if info_hash not in self.tracker_state:
-            self.tracker_state[info_hash] = {
-                "complete": [],
-                "incomplete": [],
-                "peers": []
-            }
+        stripe = self.stripe_of(info_hash)
+        with stripe.lock:
+            self._add_peer(stripe, info_hash, peer_id, ip, port, event, left, now)
+
+    def _add_peer(self, stripe, info_hash, peer_id, ip, port, event, left, now):
+        # One shared string per swarm instead of one per heap and index entry
+        info_hash = sys.intern(info_hash)
 
         # Direct access to tracker_state
-        peers = self.tracker_state[info_hash]["peers"]
+        state = self.get_or_create_swarm(info_hash)
+        peers = state["peers"]
+
+        # Find peer by its endpoint
+        key = encode_peer(ip, port)
+        existing_peer = peers.get(key)
 
-        # Find peer by ip and port
-        existing_peer = next((peer for peer in peers if peer["ip"] == ip and peer["port"] == port), None)
+        if existing_peer:
+            existing_peer.last_seen = now
 
         if event == "started":
             print("Event: started")
             if not existing_peer:
                 # Add new peer
-                new_peer = {"peer_id": peer_id, "ip": ip, "port": port, "left": left}
-                peers.append(new_peer)
-                if left == 0:
-                    self.tracker_state[info_hash]["complete"].append(new_peer)
-                else:
-                    self.tracker_state[info_hash]["incomplete"].append(new_peer)
+                expires_at = now + self.peer_ttl
+                existing_peer = peers[key] = PeerRecord(peer_id, left, now, expires_at)
+                existing_peer.complete = left == 0
+                with self.index_lock:
+                    swarms = self.peer_index.get(key)
+                    if swarms is None:
+                        self.peer_index[key] = (info_hash,)
+                    elif isinstance(swarms, tuple):
+                        self.peer_index[key] = {swarms[0], info_hash}
+                    else:
+                        swarms.add(info_hash)
+                self.add_compact_peer(state, key, existing_peer)
+                stripe.total_peers += 1
+                if existing_peer.complete:
+                    stripe.total_complete += 1
+                heapq.heappush(stripe.expiry_heap, (expires_at, info_hash, key))
             else:
                 # Update peer if peer_id is different
-                if existing_peer["peer_id"] != peer_id:
-                    existing_peer["peer_id"] = peer_id
+                if existing_peer.peer_id != peer_id:
+                    existing_peer.peer_id = peer_id
                     print(f"Peer ID updated for {ip}:{port}")
 
                 # Update left state
-                existing_peer["left"] = left
-                if left == 0:
-                    if existing_peer not in self.tracker_state[info_hash]["complete"]:
-                        self.tracker_state[info_hash]["complete"].append(existing_peer)
-                    if existing_peer in self.tracker_state[info_hash]["incomplete"]:
-                        self.tracker_state[info_hash]["incomplete"].remove(existing_peer)
-                else:
-                    if existing_peer not in self.tracker_state[info_hash]["incomplete"]:
-                        self.tracker_state[info_hash]["incomplete"].append(existing_peer)
-                    if existing_peer in self.tracker_state[info_hash]["complete"]:
-                        self.tracker_state[info_hash]["complete"].remove(existing_peer)
+                existing_peer.left = left
+                self.set_peer_status(stripe, state, key, existing_peer, left == 0)
 
         elif event == "completed":
             print("Event: completed")
-            if existing_peer and existing_peer["left"] > 0:
-                existing_peer["left"] = 0
+            if existing_peer and existing_peer.left > 0:
+                existing_peer.left = 0
                 # Move peer from incomplete to complete
-                if existing_peer in self.tracker_state[info_hash]["incomplete"]:
-                    self.tracker_state[info_hash]["incomplete"].remove(existing_peer)
-                if existing_peer not in self.tracker_state[info_hash]["complete"]:
-                    self.tracker_state[info_hash]["complete"].append(existing_peer)
-
-    def remove_peer_by_ip_port(self, ip, port):
-        """Remove peer from all lists based on ip and port."""
-        for info_hash, state in self.tracker_state.items():
-            peer_to_remove = next((peer for peer in state["peers"] if peer["ip"] == ip and peer["port"] == port), None)
-            if peer_to_remove:
-                state["peers"].remove(peer_to_remove)
-                if peer_to_remove in state["complete"]:
-                    state["complete"].remove(peer_to_remove)
-                if peer_to_remove in state["incomplete"]:
-                    state["incomplete"].remove(peer_to_remove)
-                print(f"Peer {ip}:{port} removed from info_hash {info_hash}")
+                self.set_peer_status(stripe, state, key, existing_peer, True)
+                state["downloaded"] += 1
+
+    def get_or_create_swarm(self, info_hash):
+        """Return the swarm of info_hash, creating it. The caller holds the stripe lock of info_hash."""
+        state = self.tracker_state.get(info_hash)
+        if state is None:
+            state = self.tracker_state[info_hash] = {
+                "peers": {},
+                "seeders": bytearray(),
+                "leechers": bytearray(),
+                "downloaded": 0
+            }
+        return state
+
+    def set_peer_status(self, stripe, state, key, peer, complete):
+        """Mark the peer complete or incomplete, moving its compact entry to the matching array."""
+        if peer.complete != complete:
+            self.remove_compact_peer(state, peer)
+            peer.complete = complete
+            self.add_compact_peer(state, key, peer)
+            stripe.total_complete += 1 if complete else -1
+
+    def add_compact_peer(self, state, key, peer):
+        """Append the compact entry of the peer to the swarm's packed list of its status."""
+        compact = state["seeders"] if peer.complete else state["leechers"]
+        peer.slot = len(compact) // COMPACT_PEER_SIZE
+        compact += key
+        state.pop("replies", None)
+
+    def remove_compact_peer(self, state, peer):
+        """Remove the compact entry of the peer by moving the last entry into its slot."""
+        compact = state["seeders"] if peer.complete else state["leechers"]
+        start = peer.slot * COMPACT_PEER_SIZE
+        last_start = len(compact) - COMPACT_PEER_SIZE
+        if start != last_start:
+            # The last entry is the endpoint of the peer that moves
+            last_key = bytes(compact[last_start:])
+            compact[start:start + COMPACT_PEER_SIZE] = last_key
+            state["peers"][last_key].slot = peer.slot
+        del compact[last_start:]
+        state.pop("replies", None)
+
+    def remove_peer_from_swarm(self, stripe, info_hash, key):
+        """
+        Remove the peer from one swarm and drop that swarm from its peer_index entry.
+        The caller holds the stripe lock of info_hash.
+        """
+        state = self.tracker_state.get(info_hash)
+        peer = state["peers"].pop(key, None) if state else None
+        if peer is None:
+            return False
+
+        if peer.complete:
+            stripe.total_complete -= 1
+        self.remove_compact_peer(state, peer)
+        stripe.total_peers -= 1
+
+        with self.index_lock:
+            swarms = self.peer_index.get(key)
+            if isinstance(swarms, tuple):
+                if swarms[0] == info_hash:
+                    del self.peer_index[key]
+            elif swarms is not None:
+                swarms.discard(info_hash)
+                if not swarms:
+                    del self.peer_index[key]
+        return True
+
+    def remove_peer_by_ip_port(self, ip, port, journal=False):
+        """
+        Remove peer from all lists based on ip and port. With journal, every swarm
+        left is journaled under its stripe lock, so the journal orders the removal
+        with the other announces of that swarm exactly as they were applied.
+        """
+        key = encode_peer(ip, port)
+        with self.index_lock:
+            # A copy, the set changes as the peer leaves its swarms
+            info_hashes = tuple(self.peer_index.get(key, ()))
+
+        # Each swarm is updated under its own stripe lock, one stripe at a time
+        for info_hash in info_hashes:
+            stripe = self.stripe_of(info_hash)
+            with stripe.lock:
+                if self.remove_peer_from_swarm(stripe, info_hash, key):
+                    if journal and self.journal:
+                        # Replays like an expiry, both remove the peer from a single swarm
+                        self.journal.record_expire(info_hash, ip, port)
+                    print(f"Peer {ip}:{port} removed from info_hash {info_hash}")
+
+    def expire_peer(self, info_hash, ip, port):
+        """Remove the peer from one swarm."""
+        stripe = self.stripe_of(info_hash)
+        with stripe.lock:
+            self.remove_peer_from_swarm(stripe, info_hash, encode_peer(ip, port))
+
+    def leave_swarm(self, info_hash, ip, port):
+        """Remove the peer from the swarm of info_hash only, it stays in its other swarms."""
+        stripe = self.stripe_of(info_hash)
+        with stripe.lock:
+            if self.remove_peer_from_swarm(stripe, info_hash, encode_peer(ip, port)) and self.journal:
+                # Replays like an expiry, both remove the peer from a single swarm
+                self.journal.record_expire(info_hash, ip, port)
+
+    def announce_batch(self, peer_id, ip, port, entries, numwant=DEFAULT_NUMWANT):
+        """
+        Apply the (info_hash, event, left) announces of one peer and return
+        {info_hash: get_compact_peers result}. A "stopped" entry only leaves the
+        swarm of its info_hash and gets the swarm counts without peers.
+        """
+        results = {}
+        for info_hash, event, left in entries:
+            if event == "stopped":
+                self.leave_swarm(info_hash, ip, port)
+                results[info_hash] = self.get_compact_peers(info_hash, (ip, port), 0)
+            else:
+                self.add_peer(info_hash, peer_id, ip, port, event, left)
+                results[info_hash] = self.get_compact_peers(info_hash, (ip, port), numwant)
+        return results
+
+    def reap_expired_peers(self, now=None):
+        """Remove peers that have not announced within peer_ttl. Returns the number of removed peers."""
+        if now is None:
+            now = time.time()
+
+        removed = 0
+        for stripe in self.stripes:
+            with stripe.lock:
+                heap = stripe.expiry_heap
+                while heap and heap[0][0] <= now:
+                    deadline, info_hash, key = heapq.heappop(heap)
+                    state = self.tracker_state.get(info_hash)
+                    peer = state["peers"].get(key) if state else None
+
+                    # Entry of a peer that already left or was rescheduled
+                    if peer is None or peer.expires_at != deadline:
+                        continue
+
+                    expires_at = peer.last_seen + self.peer_ttl
+                    if expires_at > now:
+                        # Peer announced since the entry was scheduled
+                        peer.expires_at = expires_at
+                        heapq.heappush(heap, (expires_at, info_hash, key))
+                        continue
+
+                    self.remove_peer_from_swarm(stripe, info_hash, key)
+                    if self.journal:
+                        self.journal.record_expire(info_hash, *decode_peer(key))
+                    removed += 1
+
+        if removed:
+            print(f"Expired {removed} peers that stopped announcing")
+        return removed
+
+    def stats(self):
+        """Return tracker wide gauges from the maintained counters."""
+        total_peers = sum(stripe.total_peers for stripe in self.stripes)
+        total_complete = sum(stripe.total_complete for stripe in self.stripes)
+        return {
+            "swarms": len(self.tracker_state),
+            "peers": total_peers,
+            "seeders": total_complete,
+            "leechers": total_peers - total_complete,
+            "tracked_endpoints": len(self.peer_index)
+        }
+
+    def dump_snapshot(self):
+        """
+        Return a JSON serializable copy of the swarms:
+        {info_hash: {"downloaded": n, "peers": [[peer_id, ip, port, left, last_seen]]}}
+        """
+        with self.lock_all_stripes():
+            return {
+                info_hash: {
+                    "downloaded": state["downloaded"],
+                    "peers": [
+                        [peer.peer_id, *decode_peer(key), peer.left, peer.last_seen]
+                        for key, peer in state["peers"].items()
+                    ]
+                }
+                for info_hash, state in self.tracker_state.items()
+            }
+
+    def load_snapshot(self, swarms):
+        """Restore swarms produced by dump_snapshot, keeping each peer's last_seen time."""
+        for info_hash, swarm in swarms.items():
+            stripe = self.stripe_of(info_hash)
+            with stripe.lock:
+                self.get_or_create_swarm(sys.intern(info_hash))["downloaded"] = swarm["downloaded"]
+                for peer_id, ip, port, left, last_seen in swarm["peers"]:
+                    self._add_peer(stripe, info_hash, peer_id, ip, port, "started", left, last_seen)
 
     def get_peers(self, info_hash):
+        """
+        Return the live swarm state of info_hash. Callers that read the returned
+        state should hold Tracker.stripe_lock(info_hash) while doing so.
+        """
         if info_hash not in self.tracker_state:
             return None, "Invalid info_hash", None
 
         return self.tracker_state.get(info_hash), None, "Request successful"
+
+    def get_compact_peers(self, info_hash, exclude_endpoint=None, numwant=DEFAULT_NUMWANT):
+        """
+        Return (complete, incomplete, compact peers) of the swarm, where the compact
+        peers are at most numwant pre-packed entries picked for the (ip, port)
+        exclude_endpoint by pick_compact_peers, never including itself. Returns None
+        if the swarm does not exist.
+        """
+        with self.stripe_lock(info_hash):
+            state = self.tracker_state.get(info_hash)
+            if state is None:
+                return None
+
+            requester = state["peers"].get(encode_peer(*exclude_endpoint)) if exclude_endpoint else None
+            if requester and requester.complete:
+                compact_peers = self.pick_compact_peers(state, True, numwant)
+            else:
+                compact_peers = self.pick_compact_peers(state, False, numwant, requester.slot if requester else None)
+
+            return (len(state["seeders"]) // COMPACT_PEER_SIZE, len(state["leechers"]) // COMPACT_PEER_SIZE,
+                    compact_peers)
+
+    def pick_compact_peers(self, state, seeder, numwant, excluded_leecher=None):
+        """
+        Pick at most numwant compact peers for a seeder or a leecher, leaving out
+        the leecher at index excluded_leecher. A seeder only gets leechers. A leecher
+        gets up to SEEDER_SHARE of numwant seeders, more if there are not enough
+        leechers, and leechers for the rest. Each part is a uniform random sample
+        drawn in O(numwant).
+        """
+        if seeder:
+            # Seeders have nothing to download from each other
+            return sample_compact_peers(state["leechers"], numwant)
+
+        seeders = state["seeders"]
+        leechers = state["leechers"]
+        other_leechers = len(leechers) // COMPACT_PEER_SIZE - (excluded_leecher is not None)
+        wanted_seeders = min(len(seeders) // COMPACT_PEER_SIZE,
+                             max(math.ceil(numwant * SEEDER_SHARE), numwant - other_leechers))
+        return (sample_compact_peers(seeders, wanted_seeders) +
+                sample_compact_peers(leechers, numwant - wanted_seeders, excluded_leecher))
+
+    def cached_reannounce(self, info_hash, ip, port, event, left, numwant, now=None):
+        """
+        Answer a re-announce sent within min_interval of the peer's last announce
+        that changes nothing (event "started", same complete status) from the
+        swarm's reply cache, without touching the swarm or the journal. Returns
+        the get_compact_peers tuple, or None if the announce has to be applied.
+        """
+        if event != "started":
+            return None
+        if now is None:
+            now = time.time()
+
+        key = encode_peer(ip, port)
+        with self.stripe_lock(info_hash):
+            state = self.tracker_state.get(info_hash)
+            peer = state["peers"].get(key) if state else None
+            if peer is None or peer.complete != (left == 0) or now - peer.last_seen >= self.min_interval:
+                return None
+
+            replies = state.setdefault("replies", {})
+            cached = replies.get((peer.complete, numwant))
+            if cached is None or cached[0] <= now:
+                # One extra peer, so numwant remain once the requester is dropped
+                cached = replies[(peer.complete, numwant)] = (now + REPLY_CACHE_TTL,
+                                                              self.pick_compact_peers(state, peer.complete, numwant + 1))
+            compact_peers = cached[1]
+
+            for start in range(0, len(compact_peers), COMPACT_PEER_SIZE):
+                if compact_peers[start:start + COMPACT_PEER_SIZE] == key:
+                    compact_peers = compact_peers[:start] + compact_peers[start + COMPACT_PEER_SIZE:]
+                    break
+            compact_peers = compact_peers[:numwant * COMPACT_PEER_SIZE]
+
+            return (len(state["seeders"]) // COMPACT_PEER_SIZE, len(state["leechers"]) // COMPACT_PEER_SIZE,
+                    compact_peers)
+
+    def scrape(self, info_hashes=None):
+        """
+        Return {info_hash: (complete, incomplete, downloaded)} for the requested
+        swarms, or for every swarm if info_hashes is empty. Unknown info_hashes are
+        left out. Counts come from the maintained counters, no peer list is walked.
+        """
+        if not info_hashes:
+            # Copy the keys, swarms may be created by other stripes meanwhile
+            info_hashes = list(self.tracker_state)
+
+        stats = {}
+        for info_hash in info_hashes:
+            with self.stripe_lock(info_hash):
+                state = self.tracker_state.get(info_hash)
+                if state is not None:
+                    stats[info_hash] = (len(state["seeders"]) // COMPACT_PEER_SIZE,
+                                        len(state["leechers"]) // COMPACT_PEER_SIZE, state["downloaded"])
+        return stats
     
     def print_tracker_state(self):
         """Print the tracker_state using BeautifulTable."""
-        if not self.tracker_state:
-            print("Tracker state is empty.")
-            return
+        with self.lock_all_stripes():
+            if not self.tracker_state:
+                print("Tracker state is empty.")
+                return
 
-        # Create table to display information
-        table = BeautifulTable()
-        table.columns.header = ["Info Hash", "Peer ID", "IP Address", "Port", "Status"]
+            # Create table to display information
+            table = BeautifulTable()
+            table.columns.header = ["Info Hash", "Peer ID", "IP Address", "Port", "Status"]
 
-        for info_hash, torrent_data in self.tracker_state.items():
-            for peer in torrent_data["peers"]:
-                peer_id = peer["peer_id"]
-                ip = peer["ip"]
-                port = peer["port"]
-                status = "Complete" if peer in torrent_data["complete"] else "Incomplete"
-                table.rows.append([info_hash, peer_id, ip, port, status])
+            for info_hash, torrent_data in self.tracker_state.items():
+                for key, peer in torrent_data["peers"].items():
+                    ip, port = decode_peer(key)
+                    status = "Complete" if peer.complete else "Incomplete"
+                    table.rows.append([info_hash, peer.peer_id, ip, port, status])
 
         print(table)
 
 class TrackerHTTPRequestHandler(BaseHTTPRequestHandler):
+    # Drop clients that stall mid-request instead of pinning a worker thread
+    timeout = 30
+
+    def send_response(self, code, message=None):
+        # Remember the status code for the request metrics
+        self.response_status = code
+        super().send_response(code, message)
+
     def do_GET(self):
+        started_at = time.perf_counter()
+        self.response_status = None
+        try:
+            self.route_get()
+        finally:
+            self.server.metrics.observe(self.path, self.response_status, time.perf_counter() - started_at)
+
+    def do_POST(self):
+        started_at = time.perf_counter()
+        self.response_status = None
+        try:
+            self.route_post()
+        finally:
+            self.server.metrics.observe(self.path, self.response_status, time.perf_counter() - started_at)
+
+    def route_get(self):
         try:
             if self.path == "/":
                 self.handle_root()
@@ -140,6 +703,12 @@ class TrackerHTTPRequestHandler(BaseHTTPRequestHandler):
                 self.handle_announce()
             elif self.path.startswith("/get_torrent"):
                 self.handle_get_torrent()
+            elif self.path.startswith("/scrape"):
+                self.handle_scrape()
+            elif self.path.startswith("/torrents"):
+                self.handle_torrents()
+            elif self.path == "/metrics":
+                self.handle_metrics()
             else:
                 self.send_response(404)
                 self.end_headers()
@@ -147,10 +716,12 @@ class TrackerHTTPRequestHandler(BaseHTTPRequestHandler):
             print(f"Exception in request handling: {e}")
             self.send_error(500, message="Internal Server Error")
 
-    def do_POST(self):
+    def route_post(self):
         try:
             if self.path == "/announce":
                 self.handle_announce_of_post()
+            elif self.path == "/batch_announce":
+                self.handle_batch_announce()
             else:
                 self.send_response(404)
                 self.end_headers()
@@ -158,6 +729,105 @@ class TrackerHTTPRequestHandler(BaseHTTPRequestHandler):
             print(f"Exception in request handling: {e}")
             self.send_error(500, message="Internal Server Error")
 
+    def forwarded(self):
+        """Whether the request was forwarded by another cluster node, as proven by its signature."""
+        cluster = self.server.cluster
+        node = self.headers.get(FORWARDED_HEADER)
+        if cluster is None or not node:
+            return False
+        return cluster.verify(node, self.command, self.path, self.headers.get(CLIENT_IP_HEADER, ""),
+                              self.headers.get(SIGNATURE_HEADER))
+
+    def client_ip(self):
+        """Return the peer's address, as passed on by the forwarding node for requests proxied in a cluster."""
+        if self.headers.get(CLIENT_IP_HEADER) and self.forwarded():
+            return self.headers[CLIENT_IP_HEADER]
+        return self.client_address[0]
+
+    def remote_owner(self, info_hash):
+        """Return the cluster node owning info_hash, or None if the request is served here."""
+        cluster = self.server.cluster
+        # A forwarded request is always served, so nodes with different configs cannot bounce it
+        if cluster is None or not info_hash or self.forwarded():
+            return None
+        owner = cluster.owner(info_hash)
+        return owner if owner != cluster.node_id else None
+
+    def send_to_owner(self, owner):
+        """
+        Redirect or proxy the request to the cluster node that owns its info_hash.
+        Uploads are always redirected, their body has already been consumed.
+        """
+        cluster = self.server.cluster
+        if cluster.mode == "redirect" or self.command == "POST":
+            self.send_response(307)
+            self.send_header("Location", cluster.url_for(owner, self.path))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        headers = {}
+        if self.headers.get("If-None-Match"):
+            headers["If-None-Match"] = self.headers["If-None-Match"]
+        try:
+            status, response_headers, body = cluster.forward(owner, "GET", self.path, self.client_ip(), headers=headers)
+        except Exception as e:
+            print(f"Error forwarding request to cluster node {owner}: {e}")
+            self.send_error(502, f"Cluster node {owner} unavailable")
+            return
+
+        self.send_response(status)
+        self.send_header("Content-Type", response_headers.get("Content-Type", "application/octet-stream"))
+        self.send_header("Content-Length", str(len(body)))
+        if response_headers.get("ETag"):
+            self.send_header("ETag", response_headers["ETag"])
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stop_on_cluster(self):
+        """Pass a "stopped" announce without info_hash on to every other node. Nodes that fail to answer are skipped."""
+        cluster = self.server.cluster
+        for node in cluster.nodes:
+            if node == cluster.node_id:
+                continue
+            try:
+                status, _, _ = cluster.forward(node, "GET", self.path, self.client_ip())
+                if status != 200:
+                    raise ValueError(f"HTTP status {status}")
+            except Exception as e:
+                print(f"Error passing stop on to cluster node {node}: {e}")
+
+    def scrape_cluster(self, info_hashes):
+        """
+        Scrape the local swarms and merge in the scrapes of the nodes owning the
+        other info_hashes, or of every node when info_hashes is empty. Nodes that
+        fail to answer are left out of the result.
+        """
+        cluster = self.server.cluster
+        if info_hashes:
+            groups = cluster.group_by_owner(info_hashes)
+        else:
+            groups = {node: [] for node in cluster.nodes}
+
+        stats = {}
+        local_info_hashes = groups.pop(cluster.node_id, None)
+        if local_info_hashes is not None:
+            stats.update(self.server.tracker.scrape(local_info_hashes))
+
+        for node, node_info_hashes in groups.items():
+            path = "/scrape"
+            if node_info_hashes:
+                path += "?" + urlencode([("info_hash", info_hash) for info_hash in node_info_hashes])
+            try:
+                status, _, body = cluster.forward(node, "GET", path, self.client_ip())
+                if status != 200:
+                    raise ValueError(f"HTTP status {status}")
+                for info_hash, counts in bencodepy.decode(body)[b"files"].items():
+                    stats[info_hash.decode('utf-8')] = (counts[b"complete"], counts[b"incomplete"], counts[b"downloaded"])
+            except Exception as e:
+                print(f"Error scraping cluster node {node}: {e}")
+        return stats
+
     def handle_root(self):
         """Handle request to root '/'."""
         self.send_response(200)
@@ -165,6 +835,15 @@ class TrackerHTTPRequestHandler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(b"<h1>Tracker is running</h1>")
 
+    def handle_metrics(self):
+        """Handle request to '/metrics' with request counters, latencies and swarm totals."""
+        body = self.server.metrics.render(self.server.tracker.stats())
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def handle_announce(self):
         """Handle request to '/announce'."""
         query = self.path.split('?')[-1]
@@ -175,83 +854,243 @@ class TrackerHTTPRequestHandler(BaseHTTPRequestHandler):
         port = params.get("port")
         event = params.get("event", "started")
         left = int(params.get("left", "0"))
+        try:
+            numwant = min(max(int(params.get("numwant", DEFAULT_NUMWANT)), 0), MAX_NUMWANT)
+        except ValueError:
+            self.send_error(400, "Invalid numwant")
+            return
 
         if not peer_id or not port:
             self.send_error(400, message="Missing required parameters: peer_id, or port")
             return
 
-        try:
-            if event == "stopped":
-                # If event is "stopped", no need for info_hash
-                self.server.tracker.add_peer(
-                    info_hash=None,
-                    peer_id=peer_id,
-                    ip=self.client_address[0],
-                    port=int(port),
-                    event=event,
-                    left=left
-                )
-            else:
-                if not info_hash:
-                    self.send_error(400, message="Missing required parameter: info_hash")
-                    return
+        if self.rate_limited():
+            return
 
-                self.server.tracker.add_peer(
-                    info_hash=info_hash,
-                    peer_id=peer_id,
-                    ip=self.client_address[0],
-                    port=int(port),
-                    event=event,
-                    left=left
-                )
-        except Exception as e:
-            print(f"Error adding peer: {e}")
-            self.send_error(500, message="Error updating tracker state")
+        owner = self.remote_owner(info_hash)
+        if owner:
+            self.send_to_owner(owner)
             return
 
-        tracker_data, failure_reason, warning_message = self.server.tracker.get_peers(info_hash)
+        client_ip = self.client_ip()
+
+        # A re-announce before min interval that changes nothing does not touch the swarm
+        swarm = None
+        if info_hash:
+            swarm = self.server.tracker.cached_reannounce(info_hash, client_ip, int(port), event, left, numwant)
+
+        if swarm is None:
+            try:
+                if event == "stopped":
+                    # If event is "stopped", no need for info_hash
+                    self.server.tracker.add_peer(
+                        info_hash=None,
+                        peer_id=peer_id,
+                        ip=client_ip,
+                        port=int(port),
+                        event=event,
+                        left=left
+                    )
+                    # Without info_hash the peer leaves all its swarms, they may be owned by any node
+                    if not info_hash and self.server.cluster and not self.forwarded():
+                        self.stop_on_cluster()
+                else:
+                    if not info_hash:
+                        self.send_error(400, message="Missing required parameter: info_hash")
+                        return
+
+                    self.server.tracker.add_peer(
+                        info_hash=info_hash,
+                        peer_id=peer_id,
+                        ip=client_ip,
+                        port=int(port),
+                        event=event,
+                        left=left
+                    )
+            except Exception as e:
+                print(f"Error adding peer: {e}")
+                self.send_error(500, message="Error updating tracker state")
+                return
+
+            if info_hash:
+                # Skip the requesting peer itself in the returned peer list
+                swarm = self.server.tracker.get_compact_peers(info_hash, (client_ip, int(port)), numwant)
+            else:
+                # A peer leaving all its swarms gets no peers back
+                swarm = (0, 0, b"")
 
-        if failure_reason:
-            response = {b"failure reason": failure_reason.encode('utf-8')}
+        if swarm is None:
+            response = {b"failure reason": b"Invalid info_hash"}
             self.send_response(400)
             self.send_header("Content-Type", "application/octet-stream")
             self.end_headers()
             self.wfile.write(bencodepy.encode(response))
             return
 
-        complete_peers = len(tracker_data["complete"])
-        incomplete_peers = len(tracker_data["incomplete"])
-        all_peers = [
-            peer for peer in tracker_data["peers"]
-            if peer["peer_id"] != peer_id
-        ]
+        complete_peers, incomplete_peers, compact_peers = swarm
+        response = encode_announce_response(
+            complete_peers,
+            incomplete_peers,
+            compact_peers,
+            self.server.tracker.tracker_id.encode('utf-8'),
+            b"Request successful",
+            self.server.tracker.min_interval
+        )
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.end_headers()
+        self.wfile.write(response)
+
+    def rate_limited(self, cost=1):
+        """
+        Take cost tokens from the client's announce bucket. If it is empty, send a
+        429 failure telling the client when to retry and return True.
+        Requests forwarded by a cluster node were already charged there.
+        """
+        if self.server.rate_limiter is None:
+            return False
+        if self.forwarded():
+            return False
+
+        retry_after = self.server.rate_limiter.acquire(self.client_ip(), cost)
+        if not retry_after:
+            return False
+
+        response = bencodepy.encode({
+            b"failure reason": b"Announcing too often, slow down",
+            b"min interval": self.server.tracker.min_interval,
+            b"retry in": math.ceil(retry_after)
+        })
+        self.send_response(429)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(response)))
+        self.send_header("Retry-After", str(math.ceil(retry_after)))
+        self.end_headers()
+        self.wfile.write(response)
+        return True
+
+    def handle_batch_announce(self):
+        """
+        Handle POST '/batch_announce': one peer announcing many torrents in one request.
+
+        request (bencoded): {"peer_id", "port", "numwant" (optional),
+                             "entries": [{"info_hash", "event", "left"}]}
+        reply   (bencoded): {"interval", "tracker id",
+                             "files": {info_hash: {"complete", "incomplete", "peers"} or {"failure reason"}}}
+
+        Unlike a single announce, a "stopped" entry only leaves the swarm of its info_hash.
+        """
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length == 0 or content_length > MAX_BATCH_BODY_SIZE:
+            self.send_error(400, "Missing or too large batch announce body")
+            return
 
+        try:
+            request = bencodepy.decode(self.rfile.read(content_length))
+            peer_id = request[b"peer_id"].decode('utf-8')
+            port = int(request[b"port"])
+            numwant = min(max(int(request.get(b"numwant", DEFAULT_NUMWANT)), 0), MAX_NUMWANT)
+            entries = [
+                (entry[b"info_hash"].decode('utf-8'), entry.get(b"event", b"started").decode('utf-8'), int(entry.get(b"left", 0)))
+                for entry in request[b"entries"]
+            ]
+        except Exception as e:
+            self.send_error(400, f"Malformed batch announce: {e}")
+            return
+
+        if not entries or len(entries) > MAX_BATCH_ENTRIES:
+            self.send_error(400, f"A batch announce carries 1 to {MAX_BATCH_ENTRIES} entries")
+            return
+        if any(event not in ANNOUNCE_EVENTS for _, event, _ in entries):
+            self.send_error(400, "Invalid event in batch announce")
+            return
+
+        if self.rate_limited(1 + len(entries) // BATCH_ENTRIES_PER_TOKEN):
+            return
+
+        client_ip = self.client_ip()
+        files = {}
+
+        cluster = self.server.cluster
+        if cluster and not self.forwarded():
+            # Each node applies the entries it owns, a batch cannot be redirected as a whole
+            groups = {}
+            for entry in entries:
+                groups.setdefault(cluster.owner(entry[0]), []).append(entry)
+            entries = groups.pop(cluster.node_id, [])
+            for node, node_entries in groups.items():
+                files.update(self.forward_batch_announce(node, peer_id, port, numwant, node_entries))
+
+        results = self.server.tracker.announce_batch(peer_id, client_ip, port, entries, numwant)
+        for info_hash, swarm in results.items():
+            if swarm is None:
+                files[info_hash.encode('utf-8')] = {b"failure reason": b"Invalid info_hash"}
+            else:
+                complete_peers, incomplete_peers, compact_peers = swarm
+                files[info_hash.encode('utf-8')] = {
+                    b"complete": complete_peers,
+                    b"incomplete": incomplete_peers,
+                    b"peers": compact_peers
+                }
+
+        response = bencodepy.encode({
+            b"interval": ANNOUNCE_INTERVAL,
+            b"min interval": self.server.tracker.min_interval,
+            b"tracker id": self.server.tracker.tracker_id.encode('utf-8'),
+            b"files": files
+        })
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def forward_batch_announce(self, node, peer_id, port, numwant, entries):
+        """Send the entries owned by another cluster node to it. Returns its per-torrent replies."""
+        body = encode_batch_request(peer_id, port, numwant, entries)
+        try:
+            status, _, response = self.server.cluster.forward(
+                node, "POST", "/batch_announce", self.client_ip(), body,
+                {"Content-Type": "application/octet-stream", "Content-Length": str(len(body))}
+            )
+            if status != 200:
+                raise ValueError(f"HTTP status {status}")
+            return bencodepy.decode(response)[b"files"]
+        except Exception as e:
+            print(f"Error forwarding batch announce to cluster node {node}: {e}")
+            failure = {b"failure reason": f"Cluster node {node} unavailable".encode('utf-8')}
+            return {info_hash.encode('utf-8'): failure for info_hash, _, _ in entries}
+
+    def handle_scrape(self):
+        """
+        Handle request to '/scrape' (BEP 48). The query may repeat info_hash to
+        scrape many torrents at once; without info_hash every swarm is returned.
+        Like /announce, info_hashes are given and returned as hex strings.
+        """
+        query = self.path.split('?', 1)[1] if '?' in self.path else ""
+        info_hashes = parse_qs(query).get("info_hash", [])
+
+        if self.server.cluster and not self.forwarded():
+            stats = self.scrape_cluster(info_hashes)
+        else:
+            stats = self.server.tracker.scrape(info_hashes)
         response = {
-            b"interval": 1800,
-            b"complete": complete_peers,
-            b"incomplete": incomplete_peers,
-            b"peers": b''.join(
-                [self.encode_peer(peer) for peer in all_peers]
-            ),
-            b"tracker id": self.server.tracker.tracker_id.encode('utf-8')
+            b"files": {
+                info_hash.encode('utf-8'): {
+                    b"complete": complete,
+                    b"incomplete": incomplete,
+                    b"downloaded": downloaded
+                }
+                for info_hash, (complete, incomplete, downloaded) in stats.items()
+            }
         }
 
-        if warning_message:
-            response[b"warning message"] = warning_message.encode('utf-8')
-
         self.send_response(200)
         self.send_header("Content-Type", "application/octet-stream")
         self.end_headers()
         self.wfile.write(bencodepy.encode(response))
 
-        self.server.tracker.print_tracker_state()
-
-    def encode_peer(self, peer):
-        """Encode peer information in binary format."""
-        ip_bytes = b"".join([int(octet).to_bytes(1, 'big') for octet in peer["ip"].split('.')])
-        port_bytes = int(peer["port"]).to_bytes(2, 'big')
-        return ip_bytes + port_bytes
-    
     def handle_announce_of_post(self):
         """Handle the /announce request from a peer."""
         try:
@@ -261,37 +1100,49 @@ class TrackerHTTPRequestHandler(BaseHTTPRequestHandler):
                 self.send_error(400, "No data received")
                 return
 
-            # Read the body to get the torrent data and parameters
-            payload, files = self.parse_multipart_request()
-
-            # Get info_hash from payload
-            info_hash = payload.get("info_hash").hex()
-            if not info_hash:
-                self.send_error(400, "Missing info_hash")
+            if self.rate_limited():
                 return
 
-            torrent_data_folder = "torrent_data_folder"
-            os.makedirs(torrent_data_folder, exist_ok=True)
+            torrent_store = self.server.torrent_store
 
-            # Path to save the file
-            torrent_file_path = os.path.join(torrent_data_folder, f"{info_hash}.torrent")
+            # Stream the body, the torrent file goes straight to a temporary file in the store
+            payload, files = self.parse_multipart_request(torrent_store.incoming_folder)
+            try:
+                # Get info_hash from payload
+                info_hash = payload.get("info_hash", b"").hex()
+                if not info_hash:
+                    self.send_error(400, "Missing info_hash")
+                    return
 
-            # Get torrent file from files
-            torrent_file = files.get('torrent_file')
-            if not torrent_file:
-                self.send_error(400, "Missing torrent_file")
-                return
+                # The torrent belongs on the owner's disk, the body is dropped here
+                owner = self.remote_owner(info_hash)
+                if owner:
+                    self.send_to_owner(owner)
+                    return
 
-            # Save the torrent file to folder
-            with open(torrent_file_path, 'wb') as f:
-                f.write(torrent_file)
+                # Get torrent file from files
+                torrent_temp_path = files.pop('torrent_file', None)
+                if not torrent_temp_path:
+                    self.send_error(400, "Missing torrent_file")
+                    return
+
+                try:
+                    torrent_file_path = torrent_store.add(info_hash, torrent_temp_path)
+                except ValueError as e:
+                    remove_file(torrent_temp_path)
+                    self.send_error(400, f"Invalid torrent_file: {e}")
+                    return
+                self.server.torrent_cache.invalidate(info_hash)
+            finally:
+                for path in files.values():
+                    remove_file(path)
 
             # Information required for the tracker
-            peer_id = payload.get("peer_id", "").decode()
+            peer_id = payload.get("peer_id", b"").decode()
             port = int(payload.get("port", 0))
             event = payload.get("event", b"started").decode()
             left = int(payload.get("left", 0))
-            ip = self.client_address[0]  # Peer IP from request
+            ip = self.client_ip()  # Peer IP from request
 
             # Add peer information to tracker
             self.server.tracker.add_peer(
@@ -309,43 +1160,62 @@ class TrackerHTTPRequestHandler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(f"Torrent file saved at {torrent_file_path}".encode('utf-8'))
 
-            self.server.tracker.print_tracker_state()
             print(f"Received torrent file for info_hash {info_hash} and saved to {torrent_file_path}")
 
         except Exception as e:
             print(f"Error handling announce request: {e}")
             self.send_error(500, "Internal Server Error")
 
-    def parse_multipart_request(self):
-        """Parse multipart/form-data request to get payload and files."""
-        content_type = self.headers.get('Content-Type')
-        if not content_type or "multipart/form-data" not in content_type:
-            raise ValueError("Invalid Content-Type for multipart request")
+    def handle_torrents(self):
+        """
+        Handle request to '/torrents', one page of the torrents stored here.
+        Query: after=<info_hash of the last torrent of the previous page>, limit=<page size>.
+        The bencoded response holds the torrents, the total count and the after
+        value of the next page when there is one. A cluster node lists its own share.
+        """
+        query = parse_qs(self.path.split('?', 1)[1] if '?' in self.path else "")
+        after = query.get("after", [None])[0]
+        try:
+            limit = int(query.get("limit", [DEFAULT_PAGE_SIZE])[0])
+        except ValueError:
+            self.send_error(400, "Invalid limit")
+            return
 
-        boundary = content_type.split("boundary=")[-1].encode()
-        content = self.rfile.read(int(self.headers['Content-Length']))
+        page, total, next_after = self.server.torrent_store.list(after, limit)
+        response = {
+            b"torrents": [
+                {
+                    b"info_hash": info_hash.encode('utf-8'),
+                    b"name": name.encode('utf-8'),
+                    b"size": size,
+                    b"piece count": piece_count
+                }
+                for info_hash, name, size, piece_count in page
+            ],
+            b"total": total
+        }
+        if next_after:
+            response[b"next"] = next_after.encode('utf-8')
+        body = bencodepy.encode(response)
 
-        # Split the multipart parts
-        parts = content.split(b"--" + boundary)
-        payload = {}
-        files = {}
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
-        for part in parts:
-            if b"Content-Disposition" in part:
-                headers, body = part.split(b"\r\n\r\n", 1)
-                body = body.rstrip(b"\r\n--")
-                headers = headers.decode()
-
-                if 'name="' in headers:
-                    name = headers.split('name="')[1].split('"')[0]
-                    if "filename=" in headers:
-                        # This is a file
-                        files[name] = body
-                    else:
-                        # This is a normal payload
-                        payload[name] = body
+    def parse_multipart_request(self, file_folder):
+        """
+        Parse multipart/form-data request to get payload and files. File parts are
+        streamed to temporary files in file_folder and returned as their paths.
+        """
+        content_type = self.headers.get('Content-Type')
+        if not content_type or "multipart/form-data" not in content_type:
+            raise ValueError("Invalid Content-Type for multipart request")
 
-        return payload, files
+        boundary = content_type.split("boundary=")[-1].strip('"').encode()
+        parser = MultipartStreamParser(boundary, file_folder)
+        return parser.parse(self.rfile, int(self.headers['Content-Length']))
 
     def handle_get_torrent(self):
         """Handle /get_torrent request from a peer to return the torrent file."""
@@ -360,23 +1230,50 @@ class TrackerHTTPRequestHandler(BaseHTTPRequestHandler):
                 self.send_error(400, "Missing required parameter: info_hash")
                 return
 
-            # Find the torrent file in the torrent_data_folder
-            torrent_data_folder = "torrent_data_folder"
-            torrent_file_path = os.path.join(torrent_data_folder, f"{info_hash}.torrent")
+            owner = self.remote_owner(info_hash)
+            if owner:
+                self.send_to_owner(owner)
+                return
+
+            torrent_cache = self.server.torrent_cache
+            cached = torrent_cache.get(info_hash)
+            if cached is not None:
+                torrent_bytes, etag = cached
+                if not self.send_torrent_headers(etag, len(torrent_bytes)):
+                    return
+                self.wfile.write(torrent_bytes)
+                print(f"Sent cached torrent file for info_hash {info_hash} to peer.")
+                return
 
-            if not os.path.exists(torrent_file_path):
+            # Unknown torrents are answered from the catalog without touching the disk
+            torrent_store = self.server.torrent_store
+            if info_hash not in torrent_store:
                 self.send_error(404, f"Torrent file for info_hash {info_hash} not found.")
                 return
 
-            # Read the torrent file content
-            with open(torrent_file_path, 'rb') as f:
-                torrent_bytes = f.read()
+            generation = torrent_cache.generation(info_hash)
+            try:
+                torrent_file = open(torrent_store.path_for(info_hash), 'rb')
+            except FileNotFoundError:
+                self.send_error(404, f"Torrent file for info_hash {info_hash} not found.")
+                return
 
-            # Send the response with the torrent file content
-            self.send_response(200)
-            self.send_header("Content-Type", "application/octet-stream")
-            self.end_headers()
-            self.wfile.write(torrent_bytes)
+            with torrent_file:
+                stat_result = os.fstat(torrent_file.fileno())
+                etag = make_etag(stat_result)
+
+                if torrent_cache.should_admit(info_hash, stat_result.st_size):
+                    # Requested again, keep it in memory for the next peers
+                    torrent_bytes = torrent_file.read()
+                    torrent_cache.put(info_hash, torrent_bytes, etag, generation)
+                    if not self.send_torrent_headers(etag, len(torrent_bytes)):
+                        return
+                    self.wfile.write(torrent_bytes)
+                else:
+                    if not self.send_torrent_headers(etag, stat_result.st_size):
+                        return
+                    # Let the kernel copy the file to the socket
+                    self.connection.sendfile(torrent_file, 0, stat_result.st_size)
 
             print(f"Sent torrent file for info_hash {info_hash} to peer.")
 
@@ -384,28 +1281,166 @@ class TrackerHTTPRequestHandler(BaseHTTPRequestHandler):
             print(f"Error while handling /get_torrent request: {e}")
             self.send_error(500, "Error processing the request")
 
+    def send_torrent_headers(self, etag, content_length):
+        """
+        Send the headers of a /get_torrent response. Returns False if the peer
+        already has this version of the torrent and a 304 was sent instead.
+        """
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return False
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(content_length))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return True
+
+class PeriodicTask(threading.Thread):
+    """Background thread that calls task every interval seconds until stopped."""
+    def __init__(self, name, interval, task):
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.task = task
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.task()
+            except Exception as e:
+                print(f"Error in periodic task {self.name}: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """
+    HTTPServer that serves each accepted connection on a bounded pool of worker
+    threads, so a slow client only occupies one worker instead of the server.
+
+    A connection is only accepted once one of max_workers + MAX_QUEUED_REQUESTS
+    slots is free, so the connections held by the process stay bounded under
+    overload and the rest wait in the kernel backlog.
+    """
+    # Allow a burst of hundreds of clients to queue in the kernel backlog
+    request_queue_size = 256
+
+    # Seconds the accept loop waits for a free slot before checking for shutdown
+    slot_wait = 0.5
+
+    def __init__(self, server_address, handler_class, max_workers=DEFAULT_MAX_WORKERS):
+        super().__init__(server_address, handler_class)
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tracker-worker")
+        self.request_slots = threading.BoundedSemaphore(max_workers + MAX_QUEUED_REQUESTS)
+
+    def get_request(self):
+        # Leave the connection in the backlog until a slot is free, the accept
+        # loop retries it after checking for shutdown
+        if not self.request_slots.acquire(timeout=self.slot_wait):
+            raise OSError("No free request slot")
+        try:
+            return super().get_request()
+        except OSError:
+            self.request_slots.release()
+            raise
+
+    def shutdown_request(self, request):
+        # Every accepted connection is shut down exactly once, its slot is freed with it
+        try:
+            super().shutdown_request(request)
+        finally:
+            self.request_slots.release()
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        # Requests in progress still journal their announces, they finish first
+        self.executor.shutdown(wait=True)
+
 class TrackerHTTPServer:
-    def __init__(self, tracker_id, tracker_ip, tracker_port):
+    def __init__(self, tracker_id, tracker_ip, tracker_port, max_workers=DEFAULT_MAX_WORKERS, state_folder=DEFAULT_STATE_FOLDER, udp_port=None, cluster=None,
+                 announce_rate=ANNOUNCE_RATE, announce_burst=ANNOUNCE_BURST, torrent_store_folder=DEFAULT_TORRENT_STORE_FOLDER):
         self.tracker_id = tracker_id
         self.tracker_ip = tracker_ip
         self.tracker_port = tracker_port
+        self.max_workers = max_workers
+        self.udp_port = udp_port
+        self.cluster = cluster
 
         # Initialize Tracker object to store important information
         self.tracker = Tracker(tracker_id)
+
+        # Restore the swarms from the last run, then compact them into a fresh snapshot
+        self.journal = TrackerJournal(state_folder)
+        self.journal.restore(self.tracker)
+        self.journal.snapshot(self.tracker)
+        self.tracker.journal = self.journal
         
         # Create HTTP server with handler and assign tracker to server
-        self.server = HTTPServer((tracker_ip, tracker_port), TrackerHTTPRequestHandler)
+        self.server = ThreadPoolHTTPServer((tracker_ip, tracker_port), TrackerHTTPRequestHandler, max_workers)
         self.server.tracker = self.tracker  # Assign tracker to server for handler access
+        self.server.torrent_cache = TorrentFileCache()
+        # Uploaded torrents, saved flat in the working directory by older trackers
+        self.server.torrent_store = TorrentStore(torrent_store_folder, LEGACY_TORRENT_FOLDER,
+                                                 cluster.is_local if cluster else None)
+        self.server.cluster = cluster  # Shard of the info_hash space served here, None when running alone
+        # Announce rate limiting per client ip, disabled when announce_rate is None
+        self.server.rate_limiter = None
+        if announce_rate is not None:
+            self.server.rate_limiter = TokenBucketLimiter(announce_rate, announce_burst)
+        self.server.metrics = TrackerMetrics(["/", "/announce", "/batch_announce", "/get_torrent", "/scrape", "/torrents", "/metrics",
+                                              "udp:connect", "udp:announce", "udp:scrape"])
+
+        # Optional UDP tracker (BEP 15) sharing the same tracker state
+        self.udp_server = None
+        if udp_port is not None:
+            self.udp_server = TrackerUDPServer(self.tracker, tracker_ip, udp_port, ANNOUNCE_INTERVAL,
+                                               DEFAULT_NUMWANT, MAX_NUMWANT, self.server.metrics, cluster,
+                                               self.server.rate_limiter)
+
+        # Background thread removing peers that crashed without sending "stopped"
+        self.reaper = PeriodicTask("peer-reaper", REAP_INTERVAL, self.tracker.reap_expired_peers)
+
+        # Background thread writing snapshots so the journal stays short
+        self.snapshotter = PeriodicTask("tracker-snapshot", SNAPSHOT_INTERVAL, lambda: self.journal.snapshot(self.tracker))
 
     def start(self):
-        print(f"Tracker HTTP Server started at http://{self.tracker_ip}:{self.tracker_port}")
+        print(f"Tracker HTTP Server started at http://{self.tracker_ip}:{self.tracker_port} with {self.max_workers} workers")
+        if self.cluster:
+            print(f"Cluster node {self.cluster.node_id} of {len(self.cluster.nodes)} nodes, {self.cluster.mode} mode")
         server_thread = threading.Thread(target=self.server.serve_forever)
         server_thread.daemon = True
         server_thread.start()
+        if self.udp_server:
+            print(f"Tracker UDP Server started at udp://{self.tracker_ip}:{self.udp_port}")
+            self.udp_server.start()
+        self.reaper.start()
+        self.snapshotter.start()
 
     def stop(self):
+        self.reaper.stop()
+        self.snapshotter.stop()
         self.server.shutdown()
         self.server.server_close()
+        if self.udp_server:
+            self.udp_server.stop()
+        self.journal.snapshot(self.tracker)
+        self.journal.close()
         print("Tracker HTTP Server stopped")
 
 
@@ -414,16 +1449,34 @@ if __name__ == "__main__":
         tracker_id = "-TK0001-0001"
         tracker_host = get_tracker_host()
         tracker_port = 22236
-
-        tracker_server = TrackerHTTPServer(tracker_id, tracker_host, tracker_port)
+        tracker_workers = DEFAULT_MAX_WORKERS
+        tracker_state_folder = DEFAULT_STATE_FOLDER
+        tracker_store_folder = DEFAULT_TORRENT_STORE_FOLDER
+        tracker_cluster = None
+
+        if len(sys.argv) == 3:
+            # Cluster node: python tracker.py <cluster config> <node id>
+            tracker_cluster = load_cluster_config(sys.argv[1], sys.argv[2])
+            node_url = urlparse(tracker_cluster.nodes[tracker_cluster.node_id])
+            tracker_host, tracker_port = node_url.hostname, node_url.port
+            tracker_state_folder = os.path.join(DEFAULT_STATE_FOLDER, tracker_cluster.node_id)
+            tracker_store_folder = os.path.join(DEFAULT_TORRENT_STORE_FOLDER, tracker_cluster.node_id)
+
+        tracker_udp_port = tracker_port
+
+        tracker_server = TrackerHTTPServer(tracker_id, tracker_host, tracker_port, tracker_workers,
+                                           tracker_state_folder, tracker_udp_port, tracker_cluster,
+                                           torrent_store_folder=tracker_store_folder)
         tracker_server.start()
 
         # Keep the server running until the 'stop' command is received
         while True:
-            command = input("Type 'stop' to stop the tracker: ")
+            command = input("Type 'state' to print the tracker state or 'stop' to stop the tracker: ")
             if command == "stop":
                 tracker_server.stop()
                 break
+            elif command == "state":
+                tracker_server.tracker.print_tracker_state()
             else:
                 continue
 
@@ -0,0 +1,134 @@
+import hmac
+import json
+import time
+import bisect
+import hashlib
+import http.client
+from urllib.parse import urlparse
+
+"""
+    Static cluster membership for running several trackers side by side. The
+    info_hash space is split over the nodes with a consistent hash ring, so
+    adding or removing a node only moves the swarms of its neighbours on the ring.
+
+    Cluster config (JSON), the same file is given to every node:
+        {
+            "mode": "redirect" | "proxy",
+            "virtual_nodes": 64,
+            "secret": "<shared secret of the nodes>",
+            "nodes": {"node-a": "http://127.0.0.1:22236", "node-b": "http://127.0.0.1:22237"}
+        }
+
+    A node serves the swarms it owns. A request for a single info_hash it does not
+    own is either redirected to the owner (307, the client re-sends it there) or
+    proxied to it. Requests a node forwards carry FORWARDED_HEADER so they are
+    never forwarded again, and CLIENT_IP_HEADER so the owner registers the peer's
+    address instead of the forwarding node's.
+
+    Forwarded requests skip routing and rate limiting and choose the peer's
+    address, so they must come from a node: SIGNATURE_HEADER carries
+    "<timestamp>:<hmac>", an HMAC-SHA256 with the shared secret over the
+    forwarding node, method, path, client address and timestamp. The body is not
+    covered. Signatures older than MAX_SIGNATURE_AGE seconds are refused.
+"""
+
+CLUSTER_MODES = ("redirect", "proxy")
+
+# Points every node gets on the hash ring, more points spread the swarms more evenly
+DEFAULT_VIRTUAL_NODES = 64
+
+# Seconds to wait for another node when proxying
+FORWARD_TIMEOUT = 5
+
+# Seconds a forwarded request's signature stays valid, allowing for clock skew between nodes
+MAX_SIGNATURE_AGE = 30
+
+FORWARDED_HEADER = "X-Tracker-Forwarded"
+CLIENT_IP_HEADER = "X-Forwarded-For"
+SIGNATURE_HEADER = "X-Tracker-Signature"
+
+
+def ring_point(value):
+    return int.from_bytes(hashlib.sha1(value.encode('utf-8')).digest()[:8], 'big')
+
+
+def load_cluster_config(config_path, node_id):
+    """Load a cluster config file as seen by the node node_id."""
+    with open(config_path, "r") as file:
+        config = json.load(file)
+    return TrackerCluster(node_id, config["nodes"], config["secret"], config.get("mode", "redirect"),
+                          config.get("virtual_nodes", DEFAULT_VIRTUAL_NODES))
+
+
+class TrackerCluster:
+    def __init__(self, node_id, nodes, secret, mode="redirect", virtual_nodes=DEFAULT_VIRTUAL_NODES):
+        if node_id not in nodes:
+            raise ValueError(f"Node {node_id} is not part of the cluster")
+        if not secret:
+            raise ValueError("The cluster needs a shared secret to authenticate forwarded requests")
+        if mode not in CLUSTER_MODES:
+            raise ValueError(f"Invalid cluster mode: {mode}")
+
+        self.node_id = node_id
+        self.nodes = {node: url.rstrip("/") for node, url in nodes.items()}
+        self.mode = mode
+        self.secret = secret.encode('utf-8')
+
+        ring = sorted((ring_point(f"{node}#{index}"), node) for node in self.nodes for index in range(virtual_nodes))
+        self.ring_points = [point for point, _ in ring]
+        self.ring_nodes = [node for _, node in ring]
+
+    def owner(self, info_hash):
+        """Return the id of the node owning info_hash: the first ring point clockwise of its hash."""
+        index = bisect.bisect(self.ring_points, ring_point(info_hash)) % len(self.ring_points)
+        return self.ring_nodes[index]
+
+    def is_local(self, info_hash):
+        return self.owner(info_hash) == self.node_id
+
+    def group_by_owner(self, info_hashes):
+        """Return {node id: [info_hashes]} for the given info_hashes."""
+        groups = {}
+        for info_hash in info_hashes:
+            groups.setdefault(self.owner(info_hash), []).append(info_hash)
+        return groups
+
+    def url_for(self, node, path):
+        return self.nodes[node] + path
+
+    def sign(self, node, method, path, client_ip, timestamp):
+        message = f"{node}\n{method}\n{path}\n{client_ip}\n{timestamp}".encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def verify(self, node, method, path, client_ip, signature, now=None):
+        """Whether signature proves that the request was forwarded by node of this cluster."""
+        if node not in self.nodes or not signature or ":" not in signature:
+            return False
+        timestamp, digest = signature.split(":", 1)
+        try:
+            age = (time.time() if now is None else now) - int(timestamp)
+        except ValueError:
+            return False
+        if abs(age) > MAX_SIGNATURE_AGE:
+            return False
+        return hmac.compare_digest(digest, self.sign(node, method, path, client_ip, timestamp))
+
+    def forward(self, node, method, path, client_ip, body=None, headers=None):
+        """
+        Send a request to another node on behalf of the client at client_ip.
+        Returns (status, response headers, body).
+        """
+        parsed_url = urlparse(self.nodes[node])
+        request_headers = dict(headers or {})
+        request_headers[FORWARDED_HEADER] = self.node_id
+        request_headers[CLIENT_IP_HEADER] = client_ip
+        timestamp = str(int(time.time()))
+        request_headers[SIGNATURE_HEADER] = timestamp + ":" + self.sign(self.node_id, method, path, client_ip, timestamp)
+
+        connection = http.client.HTTPConnection(parsed_url.hostname, parsed_url.port or 80, timeout=FORWARD_TIMEOUT)
+        try:
+            connection.request(method, path, body=body, headers=request_headers)
+            response = connection.getresponse()
+            return response.status, response.msg, response.read()
+        finally:
+            connection.close()
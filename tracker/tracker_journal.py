@@ -0,0 +1,205 @@
+import os
+import json
+import queue
+import threading
+
+"""
+    Persistent tracker state: a compact snapshot plus an append-only journal.
+
+    state_folder/
+        snapshot.json           : swarms as of the last snapshot and the journal generation it covers
+        journal.<generation>.log: one JSON record per line for every announce mutation
+
+    Every announce applied to the Tracker is appended to the current journal. Taking
+    a snapshot rotates the journal to a new generation while holding all tracker locks,
+    so the snapshot contains exactly the records of all older generations. At startup
+    the snapshot is loaded and only journals newer than it are replayed, then the
+    obsolete journals are deleted.
+
+    Records are handed to a single writer thread through a queue, an announce never
+    waits on a lock shared by all stripes or on a write to disk. The queue keeps the
+    order of records of the same swarm, they are queued under its stripe lock. The
+    writer flushes the journal whenever the queue runs empty.
+
+    Journal records:
+        {"op": "announce", "info_hash", "peer_id", "ip", "port", "event", "left", "ts"}
+        {"op": "expire", "info_hash", "ip", "port"}
+
+    A "stopped" announce is journaled as one expire record per swarm the peer left,
+    journals of older trackers holding the stopped announce itself still replay.
+"""
+
+SNAPSHOT_FILE_NAME = "snapshot.json"
+JOURNAL_PREFIX = "journal."
+JOURNAL_SUFFIX = ".log"
+
+
+class TrackerJournal:
+    def __init__(self, state_folder):
+        self.state_folder = state_folder
+        os.makedirs(self.state_folder, exist_ok=True)
+
+        self.snapshot_path = os.path.join(self.state_folder, SNAPSHOT_FILE_NAME)
+        self.generation = 0
+        self.journal_file = None
+        # lines to append, a (generation, event) rotation or None to stop the writer
+        self.records = queue.SimpleQueue()
+        self.writer = None
+
+    def journal_path(self, generation):
+        return os.path.join(self.state_folder, f"{JOURNAL_PREFIX}{generation}{JOURNAL_SUFFIX}")
+
+    def journal_generations(self):
+        """Return the generations of the journals found in the state folder, oldest first."""
+        generations = []
+        for filename in os.listdir(self.state_folder):
+            if filename.startswith(JOURNAL_PREFIX) and filename.endswith(JOURNAL_SUFFIX):
+                try:
+                    generations.append(int(filename[len(JOURNAL_PREFIX):-len(JOURNAL_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(generations)
+
+    def restore(self, tracker):
+        """
+        Rebuild the tracker state from the snapshot and the newer journals, then
+        open a fresh journal generation for new records. Returns the number of
+        replayed journal records.
+        """
+        snapshot_generation = -1
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r") as file:
+                    snapshot = json.load(file)
+                snapshot_generation = snapshot["generation"]
+                tracker.load_snapshot(snapshot["swarms"])
+                print(f"Loaded tracker snapshot of generation {snapshot_generation}")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error loading tracker snapshot, replaying journals only: {e}")
+
+        replayed = 0
+        generations = self.journal_generations()
+        for generation in generations:
+            if generation <= snapshot_generation:
+                continue
+            replayed += self.replay_journal(tracker, self.journal_path(generation))
+
+        # Continue after every generation seen so far, old journals are no longer needed
+        self.generation = max(generations + [snapshot_generation]) + 1
+        self.open_journal(self.generation)
+        self.writer = threading.Thread(target=self.write_records, name="tracker-journal", daemon=True)
+        self.writer.start()
+        self.remove_journals_up_to(snapshot_generation)
+
+        print(f"Replayed {replayed} tracker journal records")
+        return replayed
+
+    def replay_journal(self, tracker, path):
+        replayed = 0
+        with open(path, "r") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn write at the end of the journal when the tracker crashed
+                    print(f"Skipping corrupt journal record in {path}")
+                    continue
+
+                if record["op"] == "announce":
+                    tracker.apply_announce(record["info_hash"], record["peer_id"], record["ip"],
+                                           record["port"], record["event"], record["left"], record["ts"])
+                elif record["op"] == "expire":
+                    tracker.expire_peer(record["info_hash"], record["ip"], record["port"])
+                replayed += 1
+        return replayed
+
+    def open_journal(self, generation):
+        self.journal_file = open(self.journal_path(generation), "a")
+
+    def write_records(self):
+        """Writer thread: append the queued records to the journal of their generation."""
+        while True:
+            item = self.records.get()
+            if item is None:
+                self.journal_file.close()
+                self.journal_file = None
+                return
+            try:
+                if isinstance(item, str):
+                    self.journal_file.write(item)
+                else:
+                    # Every record queued before the rotation belongs to the closed generation
+                    generation, rotated = item
+                    try:
+                        self.journal_file.close()
+                        self.open_journal(generation)
+                    finally:
+                        rotated.set()
+                # Records reach the OS as soon as the writer caught up
+                if self.records.empty():
+                    self.journal_file.flush()
+            except OSError as e:
+                print(f"Error writing tracker journal: {e}")
+
+    def append(self, record):
+        if self.writer is not None:
+            self.records.put(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def record_announce(self, info_hash, peer_id, ip, port, event, left, ts):
+        self.append({"op": "announce", "info_hash": info_hash, "peer_id": peer_id, "ip": ip,
+                     "port": port, "event": event, "left": left, "ts": ts})
+
+    def record_expire(self, info_hash, ip, port):
+        self.append({"op": "expire", "info_hash": info_hash, "ip": ip, "port": port})
+
+    def rotate(self):
+        """
+        Switch to a new journal generation, records appended from now on go to it.
+        Returns the generation that was closed and an event set once the writer
+        closed its journal. The caller holds every stripe lock.
+        """
+        closed_generation = self.generation
+        self.generation += 1
+        rotated = threading.Event()
+        if self.writer is not None:
+            self.records.put((self.generation, rotated))
+        else:
+            rotated.set()
+        return closed_generation, rotated
+
+    def snapshot(self, tracker):
+        """
+        Write a snapshot of the tracker state and drop the journals it covers.
+        The state is copied while holding every stripe lock of the tracker, so no
+        announce can fall between the snapshot and the new journal generation.
+        Serializing it to disk happens after the locks are released.
+        """
+        with tracker.lock_all_stripes():
+            swarms = tracker.dump_snapshot()
+            generation, rotated = self.rotate()
+
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"generation": generation, "swarms": swarms}, file, separators=(",", ":"))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.snapshot_path)
+
+        rotated.wait()
+        self.remove_journals_up_to(generation)
+        print(f"Tracker snapshot written for generation {generation}")
+
+    def remove_journals_up_to(self, generation):
+        for old_generation in self.journal_generations():
+            if old_generation <= generation:
+                try:
+                    os.remove(self.journal_path(old_generation))
+                except OSError as e:
+                    print(f"Error removing old tracker journal: {e}")
+
+    def close(self):
+        """Stop the writer once every queued record is written."""
+        if self.writer is not None:
+            writer, self.writer = self.writer, None
+            self.records.put(None)
+            writer.join()
@@ -0,0 +1,80 @@
+import threading
+
+"""
+    Request metrics of the tracker, exposed by the /metrics endpoint in the
+    Prometheus text format.
+
+    * requests  : (endpoint, status code) -> number of requests
+    * latencies : endpoint -> [count of requests per latency bucket, total seconds]
+
+    Every request only increments counters, rendering walks the (small, fixed) set
+    of endpoints and buckets, never the tracked swarms or peers.
+"""
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class TrackerMetrics:
+    def __init__(self, endpoints):
+        # Requests to unknown paths are grouped under "other" to bound the label set
+        self.endpoints = set(endpoints)
+        self.requests = {}
+        self.latencies = {}
+        self.lock = threading.Lock()
+
+    def endpoint_label(self, path):
+        endpoint = path.split('?', 1)[0]
+        return endpoint if endpoint in self.endpoints else "other"
+
+    def observe(self, path, status, seconds):
+        """Record one served request."""
+        endpoint = self.endpoint_label(path)
+
+        # Find the first bucket the latency fits in, or the implicit +Inf bucket
+        bucket = len(LATENCY_BUCKETS)
+        for index, upper_bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= upper_bound:
+                bucket = index
+                break
+
+        with self.lock:
+            # Status 0 marks a request that ended before any response was sent
+            key = (endpoint, status or 0)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            histogram = self.latencies.get(endpoint)
+            if histogram is None:
+                histogram = self.latencies[endpoint] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+            histogram[0][bucket] += 1
+            histogram[1] += seconds
+
+    def render(self, tracker_stats):
+        """
+        Render the metrics and the given tracker gauges ({name: value}) in the
+        Prometheus text exposition format.
+        """
+        with self.lock:
+            requests = sorted(self.requests.items())
+            latencies = sorted((endpoint, (list(counts), total)) for endpoint, (counts, total) in self.latencies.items())
+
+        lines = ["# TYPE tracker_requests_total counter"]
+        for (endpoint, status), count in requests:
+            lines.append(f'tracker_requests_total{{endpoint="{endpoint}",code="{status}"}} {count}')
+
+        lines.append("# TYPE tracker_request_duration_seconds histogram")
+        for endpoint, (counts, total) in latencies:
+            cumulative = 0
+            for upper_bound, count in zip(LATENCY_BUCKETS, counts):
+                cumulative += count
+                lines.append(f'tracker_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{upper_bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'tracker_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {cumulative}')
+            lines.append(f'tracker_request_duration_seconds_sum{{endpoint="{endpoint}"}} {total}')
+            lines.append(f'tracker_request_duration_seconds_count{{endpoint="{endpoint}"}} {cumulative}')
+
+        for name, value in tracker_stats.items():
+            lines.append(f"# TYPE tracker_{name} gauge")
+            lines.append(f"tracker_{name} {value}")
+
+        return ("\n".join(lines) + "\n").encode('utf-8')
@@ -0,0 +1,186 @@
+import os
+import hmac
+import time
+import struct
+import hashlib
+import threading
+import socketserver
+
+"""
+    UDP tracker protocol (BEP 15), served next to the HTTP tracker on the same
+    Tracker state. Every exchange is one request datagram and one response datagram.
+
+    connect  request : | protocol id (8) | action 0 (4) | transaction id (4) |
+             response: | action 0 (4) | transaction id (4) | connection id (8) |
+
+    announce request : | connection id (8) | action 1 (4) | transaction id (4) | info hash (20) |
+                       | peer id (20) | downloaded (8) | left (8) | uploaded (8) | event (4) |
+                       | ip (4) | key (4) | num want (4) | port (2) |
+             response: | action 1 (4) | transaction id (4) | interval (4) | leechers (4) |
+                       | seeders (4) | compact peers (6 * n) |
+
+    scrape   request : | connection id (8) | action 2 (4) | transaction id (4) | info hash (20) * n |
+             response: | action 2 (4) | transaction id (4) | (seeders, completed, leechers) (12) * n |
+
+    error    response: | action 3 (4) | transaction id (4) | message |
+
+    Connection ids are not stored: they are an HMAC of the client address and the
+    current two minute window, so a connect costs no tracker memory.
+"""
+
+PROTOCOL_ID = 0x41727101980
+
+ACTION_CONNECT = 0
+ACTION_ANNOUNCE = 1
+ACTION_SCRAPE = 2
+ACTION_ERROR = 3
+
+# Announce event codes mapped to the events used by the HTTP tracker
+EVENTS = {0: "started", 1: "completed", 2: "started", 3: "stopped"}
+
+# Seconds a connection id stays valid
+CONNECTION_ID_LIFETIME = 120
+
+# Most info hashes a single scrape datagram can carry
+MAX_SCRAPE_INFO_HASHES = 74
+
+HEADER = struct.Struct("!QII")
+CONNECT_RESPONSE = struct.Struct("!IIQ")
+ANNOUNCE_REQUEST = struct.Struct("!QII20s20sQQQIIIiH")
+ANNOUNCE_RESPONSE = struct.Struct("!IIIII")
+SCRAPE_ENTRY = struct.Struct("!III")
+ACTION_HEADER = struct.Struct("!II")
+
+
+class TrackerUDPRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        started_at = time.perf_counter()
+        action = None
+        try:
+            if len(data) < HEADER.size:
+                return
+            connection_id, action, transaction_id = HEADER.unpack_from(data)
+
+            if action == ACTION_CONNECT:
+                if connection_id != PROTOCOL_ID:
+                    return
+                response = CONNECT_RESPONSE.pack(ACTION_CONNECT, transaction_id, self.server.connection_id(self.client_address))
+            elif not self.server.valid_connection_id(connection_id, self.client_address):
+                response = self.error(transaction_id, "Invalid connection id")
+            elif action == ACTION_ANNOUNCE:
+                response = self.handle_announce(data, transaction_id)
+            elif action == ACTION_SCRAPE:
+                response = self.handle_scrape(data, transaction_id)
+            else:
+                response = self.error(transaction_id, "Unknown action")
+
+            sock.sendto(response, self.client_address)
+        except Exception as e:
+            print(f"Exception in UDP request handling: {e}")
+        finally:
+            if self.server.metrics is not None and action in (ACTION_CONNECT, ACTION_ANNOUNCE, ACTION_SCRAPE):
+                label = ("udp:connect", "udp:announce", "udp:scrape")[action]
+                self.server.metrics.observe(label, 200, time.perf_counter() - started_at)
+
+    def error(self, transaction_id, message):
+        return ACTION_HEADER.pack(ACTION_ERROR, transaction_id) + message.encode('utf-8')
+
+    def handle_announce(self, data, transaction_id):
+        if len(data) < ANNOUNCE_REQUEST.size:
+            return self.error(transaction_id, "Announce request too short")
+
+        (_, _, _, raw_info_hash, raw_peer_id, _, left, _,
+         event_code, _, _, numwant, port) = ANNOUNCE_REQUEST.unpack_from(data)
+
+        event = EVENTS.get(event_code)
+        if event is None:
+            return self.error(transaction_id, "Invalid event")
+
+        info_hash = raw_info_hash.hex()
+        cluster = self.server.cluster
+        if cluster and not cluster.is_local(info_hash):
+            # Datagrams cannot be redirected, point the client at the owning node instead
+            return self.error(transaction_id, f"info_hash is served by {cluster.nodes[cluster.owner(info_hash)]}")
+
+        ip = self.client_address[0]
+        if self.server.rate_limiter is not None and self.server.rate_limiter.acquire(ip):
+            return self.error(transaction_id, "Announcing too often, slow down")
+
+        if numwant < 0:
+            numwant = self.server.default_numwant
+        numwant = min(numwant, self.server.max_numwant)
+
+        # A re-announce before min interval that changes nothing does not touch the swarm
+        tracker = self.server.tracker
+        swarm = tracker.cached_reannounce(info_hash, ip, port, event, left, numwant)
+        if swarm is None:
+            tracker.add_peer(
+                info_hash=info_hash,
+                peer_id=raw_peer_id.decode('utf-8', 'replace'),
+                ip=ip,
+                port=port,
+                event=event,
+                left=left
+            )
+            swarm = tracker.get_compact_peers(info_hash, (ip, port), numwant) if event != "stopped" else None
+        if swarm is None:
+            complete_peers, incomplete_peers, compact_peers = 0, 0, b""
+        else:
+            complete_peers, incomplete_peers, compact_peers = swarm
+
+        header = ANNOUNCE_RESPONSE.pack(ACTION_ANNOUNCE, transaction_id, self.server.interval,
+                                        incomplete_peers, complete_peers)
+        return header + compact_peers
+
+    def handle_scrape(self, data, transaction_id):
+        raw_info_hashes = data[HEADER.size:]
+        count = min(len(raw_info_hashes) // 20, MAX_SCRAPE_INFO_HASHES)
+        info_hashes = [raw_info_hashes[i * 20:(i + 1) * 20].hex() for i in range(count)]
+
+        stats = self.server.tracker.scrape(info_hashes) if info_hashes else {}
+        parts = [ACTION_HEADER.pack(ACTION_SCRAPE, transaction_id)]
+        for info_hash in info_hashes:
+            complete_peers, incomplete_peers, downloaded = stats.get(info_hash, (0, 0, 0))
+            parts.append(SCRAPE_ENTRY.pack(complete_peers, downloaded, incomplete_peers))
+        return b"".join(parts)
+
+
+class TrackerUDPServer(socketserver.UDPServer):
+    allow_reuse_address = True
+    # Large enough for an announce response with MAX_NUMWANT peers
+    max_packet_size = 8192
+
+    def __init__(self, tracker, tracker_ip, tracker_port, interval, default_numwant, max_numwant, metrics=None, cluster=None,
+                 rate_limiter=None):
+        super().__init__((tracker_ip, tracker_port), TrackerUDPRequestHandler)
+        self.tracker = tracker
+        self.interval = interval
+        self.default_numwant = default_numwant
+        self.max_numwant = max_numwant
+        self.metrics = metrics
+        self.cluster = cluster
+        self.rate_limiter = rate_limiter
+        self.secret = os.urandom(16)
+
+    def connection_id(self, client_address, window=None):
+        if window is None:
+            window = int(time.time() // CONNECTION_ID_LIFETIME)
+        message = f"{client_address[0]}:{client_address[1]}:{window}".encode('utf-8')
+        digest = hmac.new(self.secret, message, hashlib.sha1).digest()
+        return struct.unpack_from("!Q", digest)[0]
+
+    def valid_connection_id(self, connection_id, client_address):
+        # Accept ids from the current and the previous window
+        window = int(time.time() // CONNECTION_ID_LIFETIME)
+        return connection_id in (self.connection_id(client_address, window),
+                                 self.connection_id(client_address, window - 1))
+
+    def start(self):
+        server_thread = threading.Thread(target=self.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()